@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Politeness and filler words that do not change what the doctor asks
+_FILLER_WORDS = {
+    'a', 'an', 'the', 'please', 'could', 'would', 'can', 'you', 'kindly',
+    'tell', 'me', 'let', 'know', 'may', 'i', 'ask', 'so', 'ok', 'okay',
+    'well', 'now', 'just', 'then', 'doctor', 'sir', 'madam', 'hello', 'hi',
+    'thanks', 'thank'
+}
+
+# Words that make a question depend on the previous exchange ("How long has
+# it lasted?"), so the previous question becomes part of the cache key
+_CONTEXT_WORDS = {'it', 'this', 'that', 'these', 'those', 'they', 'them',
+                  'there', 'else', 'other', 'again', 'also'}
+
+
+def normalize_question(text):
+    """Reduce a question to its content words for use as a cache key"""
+    words = _WORD_PATTERN.findall((text or '').lower())
+    normalized = []
+    for word in words:
+        if word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        normalized.append(word)
+    return ' '.join(normalized)
+
+
+def conversation_state_key(messages):
+    """Describe the part of the conversation the latest question depends on
+
+    Self-contained questions share answers across sessions regardless of
+    what was asked before. Short or anaphoric questions are keyed together
+    with the previous doctor question.
+    """
+    questions = [m.get('content', '') for m in messages
+                 if m.get('role') == 'user']
+    if len(questions) < 2:
+        return ''
+    words = normalize_question(questions[-1]).split()
+    if len(words) > 3 and not _CONTEXT_WORDS.intersection(words):
+        return ''
+    return normalize_question(questions[-2])
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_entries=2000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, answer):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+                'evictions': self.evictions
+            }
+
+
+class AnswerCache(TTLCache):
+    """Patient answers shared across sessions of the same case"""
+
+    @staticmethod
+    def make_key(case_key, messages):
+        """Cache key for the latest user question in ``messages``"""
+        question = next((m.get('content', '') for m in reversed(messages)
+                         if m.get('role') == 'user'), '')
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        return (case_key, normalized, conversation_state_key(messages))
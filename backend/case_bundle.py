@@ -0,0 +1,250 @@
+"""Precompiled bundle of the conversations/ directory
+
+Packs every case definition, analyst transcript and
+evaluation_dimensions.json into one indexed file:
+
+    magic    8 bytes   b'CASEBNDL'
+    format   uint32    BUNDLE_FORMAT_VERSION (little endian)
+    length   uint32    size of the JSON index in bytes
+    index    JSON      {"version", "created_at", "dimensions": [offset, size],
+                        "cases": {folder: {"case": [offset, size],
+                                           "transcripts": {name: [offset, size]}}}}
+    data     ...       compact JSON blobs, offsets relative to the data start
+
+The services memory-map the file and only parse the index at startup;
+blobs are parsed on first access.
+
+Build it with:
+
+    python case_bundle.py build [--conversations DIR] [--output FILE]
+
+Rebuilding while the services run is supported. Where the mapped file
+cannot be replaced (Windows), the new bundle is written next to it as
+``FILE.v<version>``. Services always map the newest of ``FILE`` and its
+versioned siblings, and the next successful build removes siblings that
+are no longer mapped.
+"""
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from datetime import datetime
+
+BUNDLE_MAGIC = b'CASEBNDL'
+BUNDLE_FORMAT_VERSION = 1
+DIMENSIONS_FILE = 'evaluation_dimensions.json'
+
+_HEADER = struct.Struct('<8sII')
+
+
+def case_sort_key(folder):
+    """Numeric order of caseN folders; names without a number sort last"""
+    try:
+        return int(folder.replace('case', ''))
+    except ValueError:
+        return sys.maxsize
+
+
+def scan_case_folders(conversations_dir):
+    """caseN folders under ``conversations_dir`` in numeric order"""
+    if not os.path.isdir(conversations_dir):
+        return []
+    folders = [item for item in os.listdir(conversations_dir)
+               if item.startswith('case')
+               and os.path.isdir(os.path.join(conversations_dir, item))]
+    return sorted(folders, key=case_sort_key)
+
+
+def build_bundle(conversations_dir, output_path):
+    """Compile ``conversations_dir`` into ``output_path``, return the case count"""
+    blobs = []
+    offset = 0
+
+    def add_blob(data):
+        nonlocal offset
+        encoded = json.dumps(data, ensure_ascii=False,
+                             separators=(',', ':')).encode('utf-8')
+        blobs.append(encoded)
+        location = [offset, len(encoded)]
+        offset += len(encoded)
+        return location
+
+    index = {
+        'version': datetime.now().strftime('%Y%m%d%H%M%S'),
+        'created_at': datetime.now().isoformat(),
+        'cases': {},
+        'dimensions': None
+    }
+
+    for folder in scan_case_folders(conversations_dir):
+        folder_path = os.path.join(conversations_dir, folder)
+        case_path = os.path.join(folder_path, f"{folder}.json")
+        if not os.path.exists(case_path):
+            print(f"跳过没有病例定义文件的文件夹: {folder}")
+            continue
+
+        with open(case_path, 'r', encoding='utf-8') as f:
+            entry = {'case': add_blob(json.load(f)), 'transcripts': {}}
+
+        for file_name in sorted(os.listdir(folder_path)):
+            if not file_name.endswith('.json') or file_name == f"{folder}.json":
+                continue
+            with open(os.path.join(folder_path, file_name), 'r', encoding='utf-8') as f:
+                entry['transcripts'][file_name[:-len('.json')]] = add_blob(json.load(f))
+
+        index['cases'][folder] = entry
+
+    dimensions_path = os.path.join(conversations_dir, DIMENSIONS_FILE)
+    if os.path.exists(dimensions_path):
+        with open(dimensions_path, 'r', encoding='utf-8') as f:
+            index['dimensions'] = add_blob(json.load(f))
+
+    index_bytes = json.dumps(index, ensure_ascii=False,
+                             separators=(',', ':')).encode('utf-8')
+
+    # Write next to the target and swap, so running services never map a
+    # half-written bundle
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+    try:
+        os.replace(tmp_path, output_path)
+    except PermissionError:
+        # Windows cannot replace a file that a running service has mapped;
+        # publish the build under a versioned name instead
+        versioned_path = f"{output_path}.v{index['version']}"
+        if os.path.exists(versioned_path):
+            versioned_path = f"{versioned_path}-{os.getpid()}"
+        os.replace(tmp_path, versioned_path)
+        print(f"数据包正在被使用，已写入: {versioned_path}")
+        return len(index['cases'])
+    _remove_versioned_bundles(output_path)
+    return len(index['cases'])
+
+
+def versioned_bundle_paths(path):
+    """Bundles published as ``path.v<version>`` while ``path`` was mapped"""
+    return [p for p in glob.glob(glob.escape(path) + '.v*') if os.path.isfile(p)]
+
+
+def latest_bundle_path(path):
+    """Newest of ``path`` and its versioned siblings, None if there is none"""
+    candidates = [p for p in [path] + versioned_bundle_paths(path)
+                  if os.path.isfile(p)]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: os.stat(p).st_mtime_ns)
+
+
+def _remove_versioned_bundles(path):
+    for versioned_path in versioned_bundle_paths(path):
+        try:
+            os.remove(versioned_path)
+        except OSError:
+            # Still mapped by a service that has not switched yet
+            pass
+
+
+class CaseBundle:
+    """Read-only, memory-mapped view of a compiled bundle"""
+
+    def __init__(self, path):
+        self.path = path
+        self._parsed = {}
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, format_version, index_length = _HEADER.unpack_from(self._mm, 0)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"不是病例数据包文件: {path}")
+            if format_version != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"不支持的数据包格式版本: {format_version}")
+            index_start = _HEADER.size
+            self._data_start = index_start + index_length
+            self.index = json.loads(self._mm[index_start:self._data_start])
+        except Exception:
+            self.close()
+            raise
+        self.mtime_ns = os.stat(path).st_mtime_ns
+
+    @property
+    def version(self):
+        return self.index.get('version')
+
+    def close(self):
+        with self._lock:
+            if getattr(self, '_mm', None) is not None:
+                self._mm.close()
+                self._mm = None
+            self._file.close()
+
+    def _read(self, key, location):
+        """Parsed blob at ``location``, None once the bundle has been closed"""
+        with self._lock:
+            if key in self._parsed:
+                return self._parsed[key]
+            if self._mm is None:
+                return None
+            start = self._data_start + location[0]
+            data = json.loads(self._mm[start:start + location[1]])
+            self._parsed[key] = data
+            return data
+
+    def case_folders(self):
+        return sorted(self.index['cases'].keys(), key=case_sort_key)
+
+    def has_case(self, folder):
+        return folder in self.index['cases']
+
+    def get_case(self, folder):
+        entry = self.index['cases'].get(folder)
+        if entry is None:
+            return None
+        return self._read(('case', folder), entry['case'])
+
+    def transcript_names(self, folder):
+        entry = self.index['cases'].get(folder)
+        return sorted(entry['transcripts'].keys()) if entry else []
+
+    def get_transcript(self, folder, name):
+        entry = self.index['cases'].get(folder)
+        if entry is None or name not in entry['transcripts']:
+            return None
+        return self._read(('transcript', folder, name), entry['transcripts'][name])
+
+    def get_dimensions(self):
+        if self.index.get('dimensions') is None:
+            return None
+        return self._read(('dimensions',), self.index['dimensions'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编译病例数据包')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='从conversations目录编译数据包')
+    build_parser.add_argument('--conversations', default=os.environ.get(
+        'CONVERSATIONS_DIR') or './conversations')
+    build_parser.add_argument('--output', default=os.environ.get(
+        'CASE_BUNDLE_PATH') or './conversations.bundle')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        count = build_bundle(args.conversations, args.output)
+        output_path = latest_bundle_path(args.output)
+        bundle = CaseBundle(output_path)
+        print(f"已编译 {count} 个病例到 {output_path} (版本 {bundle.version}, "
+              f"{os.path.getsize(output_path)} 字节)")
+        bundle.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+import json
+import os
+import struct
+import threading
+import time
+
+from case_bundle import CaseBundle, case_sort_key, latest_bundle_path, scan_case_folders
+
+
+class JsonFileCache:
+    """Process-wide cache of parsed JSON files, revalidated by file mtime
+
+    Every caller gets the same parsed object back, so the returned data must
+    be treated as read-only. A file is re-parsed only when its mtime or size
+    changes; the stat itself is skipped if the entry was validated less than
+    ``revalidate_interval`` seconds ago.
+    """
+
+    def __init__(self, revalidate_interval=1.0):
+        self.revalidate_interval = revalidate_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, path, revalidate=False):
+        """Return the parsed content of ``path``, or None if it cannot be read"""
+        path = os.path.normpath(path)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if (entry is not None and not revalidate
+                    and now - entry['checked_at'] < self.revalidate_interval):
+                self.hits += 1
+                return entry['data']
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['signature'] == signature:
+                entry['checked_at'] = now
+                self.hits += 1
+                return entry['data']
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[CaseStore] 读取JSON文件失败: {path}, 错误: {str(e)}")
+            return None
+
+        with self._lock:
+            self._entries[path] = {
+                'signature': signature,
+                'checked_at': now,
+                'data': data
+            }
+            self.loads += 1
+        return data
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normpath(path), None)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'loads': self.loads
+            }
+
+
+# Shared by every module in the process
+case_cache = JsonFileCache()
+
+
+# Compiled bundle opened at startup, None when serving from the directory
+_bundle = None
+
+
+def open_bundle(path):
+    """Map the compiled case bundle at ``path`` for all later lookups
+
+    Maps the newest of ``path`` and the ``path.v<version>`` files written
+    by rebuilds while it was in use. Returns the bundle, or None (keeping
+    the directory layout) when no such file exists or it cannot be read.
+    A bundle that is replaced or whose file has disappeared is closed.
+    """
+    global _bundle
+    latest_path = latest_bundle_path(path) if path else None
+    if latest_path is None:
+        if _bundle is not None:
+            print(f"[CaseStore] 病例数据包已移除，改用目录结构: {_bundle.path}")
+            _close_bundle()
+        else:
+            print(f"[CaseStore] 未找到病例数据包，使用目录结构: {path}")
+        return None
+    if (_bundle is not None and _bundle.path == latest_path
+            and os.stat(latest_path).st_mtime_ns == _bundle.mtime_ns):
+        return _bundle
+    try:
+        bundle = CaseBundle(latest_path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[CaseStore] 加载病例数据包失败，使用目录结构: {latest_path}, 错误: {str(e)}")
+        return None
+    _close_bundle()
+    _bundle = bundle
+    print(f"[CaseStore] 已加载病例数据包: {latest_path} (版本 {bundle.version}, "
+          f"{len(bundle.index['cases'])} 个病例)")
+    return bundle
+
+
+def _close_bundle():
+    global _bundle
+    bundle, _bundle = _bundle, None
+    if bundle is not None:
+        bundle.close()
+
+
+def get_bundle():
+    return _bundle
+
+
+def case_file_path(conversations_dir, case_folder):
+    """Path of the case definition file inside a case folder"""
+    return os.path.join(conversations_dir, case_folder, f"{case_folder}.json")
+
+
+def list_case_folders(conversations_dir):
+    """caseN folders from the bundle and the directory, in numeric order"""
+    folders = set(scan_case_folders(conversations_dir))
+    if _bundle is not None:
+        folders.update(_bundle.case_folders())
+    return sorted(folders, key=case_sort_key)
+
+
+def _bundle_is_current(bundle, path):
+    """True if the bundled copy of ``path`` may be served
+
+    Files re-saved or edited after the bundle was compiled (transcripts
+    saved by the analysis service, hot-reloaded case edits) win over the
+    bundled copy. Once the file's directory exists it is authoritative:
+    a file deleted from it is not served from the bundle either.
+    """
+    try:
+        return os.stat(path).st_mtime_ns <= bundle.mtime_ns
+    except OSError:
+        return not os.path.isdir(os.path.dirname(path))
+
+
+def load_case(conversations_dir, case_folder, revalidate=False):
+    """Load a case definition (read-only result)
+
+    Served from the bundle when it contains the case and the directory
+    copy is not newer.
+    """
+    path = case_file_path(conversations_dir, case_folder)
+    bundle = _bundle
+    if (bundle is not None and bundle.has_case(case_folder)
+            and _bundle_is_current(bundle, path)):
+        data = bundle.get_case(case_folder)
+        if data is not None:
+            return data
+    return case_cache.get(path, revalidate=revalidate)
+
+
+def list_transcripts(conversations_dir, case_folder):
+    """Names of the analyst transcripts of a case (file names without .json)
+
+    The case directory decides which transcripts exist once it is present;
+    the bundle's list is only used for cases shipped without a directory.
+    """
+    folder_path = os.path.join(conversations_dir, case_folder)
+    if os.path.isdir(folder_path):
+        return sorted(f[:-len('.json')] for f in os.listdir(folder_path)
+                      if f.endswith('.json') and f != f"{case_folder}.json")
+    bundle = _bundle
+    return bundle.transcript_names(case_folder) if bundle else []
+
+
+def load_transcript(conversations_dir, case_folder, name):
+    """Load one analyst transcript (read-only result), None if missing"""
+    path = os.path.join(conversations_dir, case_folder, f"{name}.json")
+    bundle = _bundle
+    if bundle is not None and _bundle_is_current(bundle, path):
+        data = bundle.get_transcript(case_folder, name)
+        if data is not None:
+            return data
+    return case_cache.get(path)
+
+
+def load_dimensions(dimensions_file):
+    """Evaluation dimensions from the bundle, else from ``dimensions_file``"""
+    bundle = _bundle
+    if bundle is not None and _bundle_is_current(bundle, dimensions_file):
+        dimensions = bundle.get_dimensions()
+        if dimensions is not None:
+            return dimensions
+    return case_cache.get(dimensions_file)
+
+
+class CaseSnapshot:
+    """Immutable view of the case corpus at one registry version"""
+
+    def __init__(self, version, folders, transcripts, signatures):
+        self.version = version
+        self.folders = tuple(folders)
+        self.folder_index = {folder: i for i, folder in enumerate(self.folders)}
+        # Definition files relative to conversations/, e.g. "case8/case8.json"
+        self.case_files = tuple(f"{folder}/{folder}.json" for folder in self.folders)
+        # folder -> tuple of analyst transcript names
+        self.transcripts = transcripts
+        self.signatures = signatures
+
+    def __len__(self):
+        return len(self.folders)
+
+    def folder_at(self, index):
+        if 0 <= index < len(self.folders):
+            return self.folders[index]
+        return None
+
+    def index_of(self, folder):
+        return self.folder_index.get(folder)
+
+
+def _folder_signature(conversations_dir, case_folder):
+    """Stat signature of a case folder and its definition file
+
+    The folder mtime changes when transcripts are added or removed, the
+    file signature when the case definition is edited.
+    """
+    signature = []
+    for path in (os.path.join(conversations_dir, case_folder),
+                 case_file_path(conversations_dir, case_folder)):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    bundle = _bundle
+    if bundle is not None and bundle.has_case(case_folder):
+        signature.append(bundle.version)
+    return tuple(signature)
+
+
+class CaseRegistry:
+    """Versioned case list with per-folder transcript lists
+
+    ``refresh`` rescans the corpus, rebuilds only the folders whose stat
+    signature changed and swaps in a new ``CaseSnapshot``. Readers take
+    ``registry.snapshot`` once and work on that immutable object, so they
+    never see a half-updated index. Listeners are called with
+    ``(old_snapshot, new_snapshot, changed_folders)`` after each swap.
+    """
+
+    def __init__(self, conversations_dir, bundle_path=None):
+        self.conversations_dir = conversations_dir
+        self.bundle_path = bundle_path
+        self._snapshot = CaseSnapshot(0, (), {}, {})
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+        self.rescans = 0
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Rescan the corpus and return the set of changed folders"""
+        with self._refresh_lock:
+            if self.bundle_path and (_bundle is not None
+                                     or latest_bundle_path(self.bundle_path)):
+                # Picks up a rebuilt or removed bundle; a no-op while it
+                # is unchanged
+                open_bundle(self.bundle_path)
+            old = self._snapshot
+            folders = list_case_folders(self.conversations_dir)
+            signatures = {folder: _folder_signature(self.conversations_dir, folder)
+                          for folder in folders}
+            changed = {folder for folder in folders
+                       if old.signatures.get(folder) != signatures[folder]}
+            changed.update(set(old.folders) - set(folders))
+            if old.version and not changed and tuple(folders) == old.folders:
+                return set()
+
+            transcripts = {}
+            for folder in folders:
+                if folder in changed or folder not in old.transcripts:
+                    transcripts[folder] = tuple(
+                        list_transcripts(self.conversations_dir, folder))
+                    case_cache.invalidate(
+                        case_file_path(self.conversations_dir, folder))
+                else:
+                    transcripts[folder] = old.transcripts[folder]
+
+            new = CaseSnapshot(old.version + 1, folders, transcripts, signatures)
+            self._snapshot = new
+            self.rescans += 1
+
+        print(f"[CaseStore] 病例索引已更新到版本 {new.version}: "
+              f"{len(new)} 个病例, 变化: {sorted(changed)}")
+        for listener in self._listeners:
+            try:
+                listener(old, new, changed)
+            except Exception as e:
+                print(f"[CaseStore] 病例索引更新回调失败: {str(e)}")
+        return changed
+
+
+class CompletionIndex:
+    """Case folders each user has saved a conversation for
+
+    A user has completed a case once ``{username}.json`` exists in the case
+    folder. The index is filled from registry snapshots, whose transcript
+    lists already come from one scan per changed folder, and updated in
+    place when the service saves a conversation, so navigation never has
+    to check the disk.
+    """
+
+    def __init__(self):
+        self._by_user = {}
+        self._by_folder = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def rebuild(self, snapshot):
+        """Replace the whole index with the transcripts of ``snapshot``"""
+        by_user = {}
+        by_folder = {}
+        for folder, names in snapshot.transcripts.items():
+            by_folder[folder] = set(names)
+            for name in names:
+                by_user.setdefault(name, set()).add(folder)
+        with self._lock:
+            self._by_user = by_user
+            self._by_folder = by_folder
+            self.rebuilds += 1
+
+    def update_folders(self, snapshot, folders):
+        """Re-read the transcript lists of ``folders`` from ``snapshot``"""
+        with self._lock:
+            for folder in folders:
+                old_users = self._by_folder.pop(folder, set())
+                new_users = set(snapshot.transcripts.get(folder, ()))
+                for username in old_users - new_users:
+                    self._by_user.get(username, set()).discard(folder)
+                for username in new_users - old_users:
+                    self._by_user.setdefault(username, set()).add(folder)
+                if new_users:
+                    self._by_folder[folder] = new_users
+
+    def mark_completed(self, username, folder):
+        with self._lock:
+            self._by_user.setdefault(username, set()).add(folder)
+            self._by_folder.setdefault(folder, set()).add(username)
+
+    def is_completed(self, username, folder):
+        with self._lock:
+            return folder in self._by_user.get(username, ())
+
+    def next_incomplete(self, username, folders):
+        """Index of the first folder not completed by the user
+
+        Returns the last index when every case is completed and None when
+        ``folders`` is empty.
+        """
+        if not folders:
+            return None
+        with self._lock:
+            completed = self._by_user.get(username)
+            if not completed:
+                return 0
+            for index, folder in enumerate(folders):
+                if folder not in completed:
+                    return index
+        return len(folders) - 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'users': len(self._by_user),
+                'completions': sum(len(f) for f in self._by_user.values()),
+                'rebuilds': self.rebuilds
+            }
+
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+
+class CaseWatcher:
+    """Background thread keeping a CaseRegistry in sync with conversations/
+
+    Waits on inotify events when ``inotify_simple`` is installed (Linux)
+    and falls back to polling every ``interval`` seconds otherwise. The
+    registry is rescanned at least once per interval in both modes.
+    """
+
+    def __init__(self, registry, interval=2.0):
+        self.registry = registry
+        self.interval = interval
+        self.mode = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._watched = set()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._inotify = self._open_inotify()
+        self.mode = 'inotify' if self._inotify is not None else 'polling'
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='case-watcher')
+        self._thread.start()
+        print(f"[CaseStore] 病例目录监听已启动 ({self.mode}, "
+              f"间隔 {self.interval}s): {self.registry.conversations_dir}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _open_inotify(self):
+        if INotify is None:
+            return None
+        try:
+            inotify = INotify()
+        except OSError as e:
+            print(f"[CaseStore] inotify不可用，改用轮询: {str(e)}")
+            return None
+        self._update_watches(inotify)
+        return inotify
+
+    def _update_watches(self, inotify):
+        mask = (inotify_flags.CREATE | inotify_flags.DELETE
+                | inotify_flags.MOVED_TO | inotify_flags.MOVED_FROM
+                | inotify_flags.CLOSE_WRITE)
+        root = self.registry.conversations_dir
+        paths = [root] + [os.path.join(root, folder)
+                          for folder in self.registry.snapshot.folders]
+        if self.registry.bundle_path:
+            paths.append(os.path.dirname(
+                os.path.abspath(self.registry.bundle_path)))
+        for path in paths:
+            if path in self._watched or not os.path.isdir(path):
+                continue
+            try:
+                inotify.add_watch(path, mask)
+                self._watched.add(path)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._inotify is not None:
+                if self._inotify.read(timeout=int(self.interval * 1000)):
+                    # Let a burst of writes (copying a case folder) settle
+                    time.sleep(0.2)
+                    self._inotify.read(timeout=0)
+            else:
+                self._stop.wait(self.interval)
+            if self._stop.is_set():
+                break
+            try:
+                changed = self.registry.refresh()
+            except Exception as e:
+                print(f"[CaseStore] 刷新病例索引失败: {str(e)}")
+                continue
+            if changed and self._inotify is not None:
+                self._update_watches(self._inotify)
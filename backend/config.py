@@ -19,6 +19,82 @@ class Config:
     # File path configuration
     CONVERSATIONS_DIR = os.environ.get(
         'CONVERSATIONS_DIR') or "./conversations"
+    # Compiled case bundle (python case_bundle.py build), used when present
+    CASE_BUNDLE_PATH = os.environ.get(
+        'CASE_BUNDLE_PATH') or "./conversations.bundle"
+
+    # Hot reload of the case list (inotify when inotify_simple is installed,
+    # polling every CASE_WATCH_INTERVAL seconds otherwise)
+    CASE_WATCH_ENABLED = (os.environ.get(
+        'CASE_WATCH_ENABLED') or 'true').lower() == 'true'
+    CASE_WATCH_INTERVAL = float(os.environ.get('CASE_WATCH_INTERVAL') or 2)
+
+    # Seconds between keep-alive comments on idle /api/events push streams
+    PUSH_HEARTBEAT_INTERVAL = float(
+        os.environ.get('PUSH_HEARTBEAT_INTERVAL') or 15)
+    # Upper bound for /current-case?since_version=... long-poll requests
+    LONG_POLL_MAX_TIMEOUT = float(os.environ.get('LONG_POLL_MAX_TIMEOUT') or 25)
+
+    # In-memory user sessions: idle or least recently used sessions beyond
+    # these limits are written to SESSION_SPILL_DIR and reloaded on demand
+    SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES') or 500)
+    SESSION_MAX_BYTES = int(
+        os.environ.get('SESSION_MAX_BYTES') or 256 * 1024 * 1024)
+    SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL') or 4 * 3600)
+    # Sessions used more recently than this are never evicted
+    SESSION_MIN_IDLE = float(os.environ.get('SESSION_MIN_IDLE') or 120)
+    SESSION_SPILL_DIR = os.environ.get(
+        'SESSION_SPILL_DIR') or "./session_spill"
+
+    # LLM gateway configuration
+    LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT') or 8)
+    LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE') or 32)
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT') or 60)
+    LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE') or LLM_MAX_IN_FLIGHT)
+    LLM_PREWARM_CONNECTIONS = int(
+        os.environ.get('LLM_PREWARM_CONNECTIONS') or 1)
+
+    # Conversation context configuration (estimated tokens of recent turns
+    # sent with each request on top of the system prompts, 0 = unlimited)
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET') or 3000)
+
+    # Rolling summary of older turns, built in the background after replies
+    CONTEXT_SUMMARY_ENABLED = (os.environ.get(
+        'CONTEXT_SUMMARY_ENABLED') or 'false').lower() == 'true'
+    CONTEXT_SUMMARY_KEEP_MESSAGES = int(
+        os.environ.get('CONTEXT_SUMMARY_KEEP_MESSAGES') or 6)
+    CONTEXT_SUMMARY_MIN_MESSAGES = int(
+        os.environ.get('CONTEXT_SUMMARY_MIN_MESSAGES') or 6)
+
+    # Send only the prompt3 sections relevant to the current question. Off by
+    # default: sections are picked by keywords, so a question phrased
+    # differently can hide results the model needs
+    EXAM_INDEX_ENABLED = (os.environ.get(
+        'EXAM_INDEX_ENABLED') or 'false').lower() == 'true'
+
+    # Answer plain exam-result questions straight from prompt3 without the LLM
+    EXAM_FAST_PATH_ENABLED = (os.environ.get(
+        'EXAM_FAST_PATH_ENABLED') or 'false').lower() == 'true'
+
+    # Cross-session cache of patient answers per case: replays one user's
+    # sampled reply to other users, so it is off unless a deployment opts in
+    ANSWER_CACHE_ENABLED = (os.environ.get(
+        'ANSWER_CACHE_ENABLED') or 'false').lower() == 'true'
+    ANSWER_CACHE_MAX_ENTRIES = int(
+        os.environ.get('ANSWER_CACHE_MAX_ENTRIES') or 2000)
+    ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL') or 3600)
+
+    # Local message classifier, falling back to the LLM below the threshold
+    CLASSIFIER_LOCAL_ENABLED = (os.environ.get(
+        'CLASSIFIER_LOCAL_ENABLED') or 'true').lower() == 'true'
+    CLASSIFIER_CONFIDENCE_THRESHOLD = float(
+        os.environ.get('CLASSIFIER_CONFIDENCE_THRESHOLD') or 0.75)
+    CLASSIFIER_LABELS_FILE = os.environ.get(
+        'CLASSIFIER_LABELS_FILE') or "./classifier_labels.jsonl"
+    CLASSIFICATION_CACHE_MAX_ENTRIES = int(
+        os.environ.get('CLASSIFICATION_CACHE_MAX_ENTRIES') or 10000)
+    CLASSIFICATION_CACHE_TTL = float(
+        os.environ.get('CLASSIFICATION_CACHE_TTL') or 86400)
 
     @property
     def OPENAI_API_KEY(self):
@@ -63,6 +139,10 @@ class DockerConfig(Config):
 
     # Docker environment paths
     CONVERSATIONS_DIR = "/app/conversations"
+    CASE_BUNDLE_PATH = os.environ.get(
+        'CASE_BUNDLE_PATH') or "/app/conversations.bundle"
+    SESSION_SPILL_DIR = os.environ.get(
+        'SESSION_SPILL_DIR') or "/app/session_spill"
 
 
 # Configuration mapping
@@ -0,0 +1,119 @@
+import math
+import re
+
+# CJK ideographs and full-width punctuation are roughly one token each
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+# Fixed cost of the role/separator tokens around every chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of the earlier part of this interview:\n"
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a string without calling a tokenizer"""
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return cjk_chars + math.ceil(other_chars / 4)
+
+
+def estimate_message_tokens(message):
+    """Estimate the token count of one chat message including overhead"""
+    return estimate_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_system_prefix(messages):
+    """Split leading system messages from the conversation turns"""
+    prefix_length = 0
+    for message in messages:
+        if message.get('role') != 'system':
+            break
+        prefix_length += 1
+    return messages[:prefix_length], messages[prefix_length:]
+
+
+def build_context(messages, turn_budget, summary=None):
+    """Select the messages to send for one completion request
+
+    The system prefix is always kept. If a rolling ``summary`` is given
+    (``{'content': str, 'covered': int}``), the first ``covered`` turns are
+    replaced by one system message carrying the summary. Remaining turns are
+    added from the newest backwards until ``turn_budget`` estimated tokens
+    are used; the latest message is always included even if it alone
+    exceeds the budget. A budget of 0 or less disables trimming.
+
+    Returns the selected messages and a stats dict with token estimates.
+    """
+    prefix, turns = split_system_prefix(messages)
+    summarized = 0
+    if summary and summary.get('content'):
+        summarized = min(summary.get('covered', 0), len(turns))
+        turns = turns[summarized:]
+        prefix = prefix + [{
+            "role": "system",
+            "content": SUMMARY_HEADER + summary['content']
+        }]
+    prefix_tokens = sum(estimate_message_tokens(m) for m in prefix)
+
+    if turn_budget is None or turn_budget <= 0:
+        kept = list(turns)
+    else:
+        kept = []
+        used = 0
+        for message in reversed(turns):
+            cost = estimate_message_tokens(message)
+            if kept and used + cost > turn_budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        # Never start the window with a dangling assistant reply
+        while len(kept) > 1 and kept[0].get('role') == 'assistant':
+            kept.pop(0)
+
+    turn_tokens = sum(estimate_message_tokens(m) for m in kept)
+    stats = {
+        'prompt_tokens': prefix_tokens + turn_tokens,
+        'system_tokens': prefix_tokens,
+        'turn_tokens': turn_tokens,
+        'turns_sent': len(kept),
+        'turns_dropped': len(turns) - len(kept),
+        'turns_summarized': summarized
+    }
+    return prefix + kept, stats
+
+
+def pending_summary_turns(messages, summary, keep_recent):
+    """Return the turns not yet covered by the summary that are old enough
+
+    The newest ``keep_recent`` turns are always left verbatim.
+    """
+    _, turns = split_system_prefix(messages)
+    covered = summary.get('covered', 0) if summary else 0
+    return turns[covered:max(covered, len(turns) - keep_recent)]
+
+
+def build_summary_prompt(previous_summary, turns):
+    """Build the messages asking the LLM to fold turns into the summary"""
+    transcript = "\n".join(
+        f"{'Doctor' if m.get('role') == 'user' else 'Patient'}: {m.get('content', '')}"
+        for m in turns)
+    instruction = (
+        "You maintain a running factual summary of a doctor-patient interview. "
+        "Merge the new exchanges into the existing summary. Keep every fact the "
+        "patient has disclosed (symptoms, timeline, history, examination results "
+        "already given) and which questions the doctor has already asked. Do not "
+        "add interpretation or diagnoses. Reply with the updated summary only, "
+        "in English, as concise bullet points."
+    )
+    content = (
+        f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+        f"New exchanges:\n{transcript}"
+    )
+    return [
+        {"role": "system", "content": instruction},
+        {"role": "user", "content": content}
+    ]
@@ -10,6 +10,46 @@ class EvaluationConfig:
     EVALUATORS_DIR = os.environ.get('EVALUATORS_DIR') or "./evaluators"
     CONVERSATIONS_DIR = os.environ.get(
         'CONVERSATIONS_DIR') or "./conversations"
+    # 预编译的病例数据包（python case_bundle.py build），存在时优先使用
+    CASE_BUNDLE_PATH = os.environ.get(
+        'CASE_BUNDLE_PATH') or "./conversations.bundle"
+
+    # 病例目录热加载（安装inotify_simple时使用inotify，否则按间隔轮询）
+    CASE_WATCH_ENABLED = (os.environ.get(
+        'CASE_WATCH_ENABLED') or 'true').lower() == 'true'
+    CASE_WATCH_INTERVAL = float(os.environ.get('CASE_WATCH_INTERVAL') or 2)
+
+    # 评估数据存储方式：json（evaluators目录下的JSON文件+追加日志，默认）或 sqlite
+    # 从JSON迁移：python evaluator_store.py import-json
+    EVALUATION_STORAGE = (os.environ.get(
+        'EVALUATION_STORAGE') or 'json').lower()
+    EVALUATION_DB_PATH = os.environ.get(
+        'EVALUATION_DB_PATH') or "./evaluations.db"
+
+    # 评估者文档的追加日志：超过该大小后在后台合并进 evaluators/{username}.json
+    EVALUATOR_JOURNAL_COMPACT_BYTES = int(
+        os.environ.get('EVALUATOR_JOURNAL_COMPACT_BYTES') or 64 * 1024)
+    # 每次追加后fsync，返回成功时数据已落盘
+    EVALUATOR_JOURNAL_FSYNC = (os.environ.get(
+        'EVALUATOR_JOURNAL_FSYNC') or 'true').lower() == 'true'
+
+    # 同一用户在该时间窗口（毫秒）内的单条评分保存合并为一次写入，0为不合并
+    EVALUATOR_SAVE_COALESCE_MS = float(
+        os.environ.get('EVALUATOR_SAVE_COALESCE_MS') or 50)
+
+    # 内存中缓存的评估者文档数量（写入时同步更新，文件被外部修改时失效），0为不缓存
+    EVALUATOR_CACHE_MAX_ENTRIES = int(
+        os.environ.get('EVALUATOR_CACHE_MAX_ENTRIES') or 256)
+
+    # 内存中的用户会话上限：空闲超时或超出上限的会话写入SESSION_SPILL_DIR，
+    # 用户再次请求时自动恢复
+    SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES') or 500)
+    SESSION_MAX_BYTES = int(
+        os.environ.get('SESSION_MAX_BYTES') or 64 * 1024 * 1024)
+    SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL') or 4 * 3600)
+    SESSION_MIN_IDLE = float(os.environ.get('SESSION_MIN_IDLE') or 120)
+    SESSION_SPILL_DIR = os.environ.get(
+        'SESSION_SPILL_DIR') or "./session_spill"
 
     # 安全配置
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS') or ['*']
@@ -55,6 +95,12 @@ class EvaluationDockerConfig(EvaluationConfig):
     # Docker环境中的路径配置
     EVALUATORS_DIR = "/app/evaluators"
     CONVERSATIONS_DIR = "/app/conversations"
+    CASE_BUNDLE_PATH = os.environ.get(
+        'CASE_BUNDLE_PATH') or "/app/conversations.bundle"
+    SESSION_SPILL_DIR = os.environ.get(
+        'SESSION_SPILL_DIR') or "/app/session_spill"
+    EVALUATION_DB_PATH = os.environ.get(
+        'EVALUATION_DB_PATH') or "/app/evaluations.db"
 
 
 # 配置映射
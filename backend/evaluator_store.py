@@ -0,0 +1,1159 @@
+"""Storage for evaluator documents (evaluators/{username}.json)
+
+Every change is expressed as an event (see ``EVENT_HANDLERS``) and handed
+to ``append(username, op, **fields)``; ``load(username)`` returns the
+current document in the layout of the original JSON files. Two backends
+implement that interface:
+
+    json     EvaluatorJournal: JSON base file plus an append-only journal
+    sqlite   SQLiteEvaluatorStore: indexed tables, one transaction per event
+
+Both also answer cross-evaluator queries such as ``case_results(case_id)``.
+Existing JSON files (including pending journals) are imported with:
+
+    python evaluator_store.py import-json [--evaluators DIR] [--db FILE]
+"""
+
+import argparse
+import copy
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+
+def _case_results(document, case_id):
+    results = document.setdefault('evaluation_results', {})
+    return results.setdefault(case_id, {})
+
+
+def _apply_update(document, event):
+    document.update(event['fields'])
+
+
+def _apply_submit(document, event):
+    document.update({
+        'evaluation_results': event['evaluation_results'],
+        'submitted_at': event['at']
+    })
+    document.setdefault('feedback', {})
+
+
+def _apply_dimension_score(document, event):
+    case_results = _case_results(document, event['case_id'])
+    evaluator = case_results.setdefault(event['evaluator_id'], {'dimensions': {}})
+    evaluator.setdefault('dimensions', {})[event['dimension_key']] = event['score']
+    document['updated_at'] = event['at']
+
+
+def _apply_dimension_scores(document, event):
+    for item in event['scores']:
+        case_results = _case_results(document, item['case_id'])
+        evaluator = case_results.setdefault(item['evaluator_id'], {'dimensions': {}})
+        evaluator.setdefault('dimensions', {})[item['dimension_key']] = item['score']
+    document['updated_at'] = event['at']
+
+
+def _apply_feedback(document, event):
+    feedback = document.setdefault('feedback', {})
+    feedback.setdefault(event['case_id'], {})[event['evaluator_id']] = event['feedback']
+    document['updated_at'] = event['at']
+
+
+def _apply_initialize_case(document, event):
+    _case_results(document, event['case_id'])
+    document.setdefault('feedback', {}).setdefault(event['case_id'], {})
+    document['updated_at'] = event['at']
+
+
+def _apply_ranking(document, event):
+    _case_results(document, event['case_id']).update({
+        'ranking': event['ranking'],
+        'tiers': event['tiers'],
+        'saved_at': event['at']
+    })
+
+
+def _apply_case_state(document, event):
+    case_results = _case_results(document, event['case_id'])
+    case_results.update({
+        'saved': True,
+        'saved_at': event['at'],
+        'ranking': event['ranking']
+    })
+    # 合并每个评估者的dimensions，保留已有的评分
+    for evaluator_id, evaluator_data in event['evaluators'].items():
+        existing = case_results.get(evaluator_id)
+        if isinstance(existing, dict) and 'dimensions' in existing:
+            existing['dimensions'].update(evaluator_data['dimensions'])
+        else:
+            case_results[evaluator_id] = evaluator_data
+
+
+def _split_case_results(case_results, feedback):
+    """Shape one evaluator's entry for a case as returned by case_results()"""
+    scores = {key: value['dimensions'] for key, value in case_results.items()
+              if isinstance(value, dict) and 'dimensions' in value}
+    return {
+        'scores': scores,
+        'ranking': case_results.get('ranking'),
+        'tiers': case_results.get('tiers'),
+        'saved': bool(case_results.get('saved')),
+        'feedback': feedback
+    }
+
+
+def _collect_case_results(usernames, load, case_id):
+    """case_results() for backends without indexes: scan every document"""
+    results = {}
+    for username in usernames:
+        document = load(username)
+        if document is None:
+            continue
+        case_results = document.get('evaluation_results', {}).get(case_id)
+        feedback = document.get('feedback', {}).get(case_id)
+        if case_results is None and not feedback:
+            continue
+        results[username] = _split_case_results(case_results or {}, feedback or {})
+    return results
+
+
+EVENT_HANDLERS = {
+    'update': _apply_update,
+    'submit': _apply_submit,
+    'dimension_score': _apply_dimension_score,
+    'dimension_scores': _apply_dimension_scores,
+    'feedback': _apply_feedback,
+    'initialize_case': _apply_initialize_case,
+    'ranking': _apply_ranking,
+    'case_state': _apply_case_state
+}
+
+
+def apply_event(document, event):
+    """Apply one journal event to an evaluator document in place"""
+    EVENT_HANDLERS[event['op']](document, event)
+
+
+def _changed_paths(event):
+    """Key paths of the nested dicts an event modifies in place"""
+    op = event['op']
+    if op == 'dimension_score':
+        return [('evaluation_results', event['case_id'], event['evaluator_id'], 'dimensions')]
+    if op == 'dimension_scores':
+        return [('evaluation_results', item['case_id'], item['evaluator_id'], 'dimensions')
+                for item in event['scores']]
+    if op == 'feedback':
+        return [('feedback', event['case_id'])]
+    if op == 'initialize_case':
+        return [('evaluation_results',), ('feedback',)]
+    if op == 'ranking':
+        return [('evaluation_results', event['case_id'])]
+    if op == 'case_state':
+        return [('evaluation_results', event['case_id'])] + [
+            ('evaluation_results', event['case_id'], evaluator_id, 'dimensions')
+            for evaluator_id in event['evaluators']]
+    # update / submit only replace top-level keys
+    return []
+
+
+def apply_event_copy(document, event):
+    """Return a new document with the event applied, leaving ``document`` intact
+
+    Only the dicts on the paths the event modifies are copied; everything
+    else is shared with ``document``, so the cost does not grow with the
+    number of saved scores.
+    """
+    updated = dict(document)
+    copied = set()
+    for path in _changed_paths(event):
+        container = updated
+        for key in path:
+            value = container.get(key)
+            if not isinstance(value, dict):
+                break
+            if id(value) not in copied:
+                value = dict(value)
+                container[key] = value
+                copied.add(id(value))
+            container = value
+    apply_event(updated, event)
+    return updated
+
+
+class EvaluatorJournal:
+    """Evaluator documents stored as a JSON base file plus a JSONL journal
+
+    ``evaluators/{username}.json`` keeps its existing layout; every change
+    is appended as one event line to ``{username}.journal.jsonl`` and the
+    current document is materialised by replaying the journal over the
+    base file. Once a journal grows past ``compact_bytes`` a background
+    thread folds it into the base file (tmp file + ``os.replace``) and
+    removes it.
+
+    All events set values rather than accumulate them, so replaying a
+    journal over a base file that already contains it is harmless; this
+    covers a crash between rewriting the base file and removing the
+    journal. A torn last line (crash mid-append) is ignored.
+    """
+
+    JOURNAL_SUFFIX = '.journal.jsonl'
+
+    def __init__(self, evaluators_dir, compact_bytes=64 * 1024, fsync=True):
+        self.evaluators_dir = evaluators_dir
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._compact_queue = queue.Queue()
+        self._compactor = None
+        self.appended = 0
+        self.compactions = 0
+
+    def document_path(self, username):
+        return os.path.join(self.evaluators_dir, f'{username}.json')
+
+    def journal_path(self, username):
+        return os.path.join(self.evaluators_dir, f'{username}{self.JOURNAL_SUFFIX}')
+
+    def lock_for(self, username):
+        with self._locks_lock:
+            lock = self._locks.get(username)
+            if lock is None:
+                lock = self._locks[username] = threading.RLock()
+            return lock
+
+    def exists(self, username):
+        return os.path.exists(self.document_path(username))
+
+    def signature(self, username):
+        """Stat of the base file and journal; changes whenever either is written"""
+        values = []
+        for path in (self.document_path(username), self.journal_path(username)):
+            try:
+                stat = os.stat(path)
+                values.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                values.append(None)
+        return tuple(values)
+
+    def create(self, username, document):
+        """Write a new base document and drop any journal left from before"""
+        with self.lock_for(username):
+            self._write_document(username, document)
+            if os.path.exists(self.journal_path(username)):
+                os.remove(self.journal_path(username))
+
+    def append(self, username, op, **fields):
+        """Record one change; returns the event as written"""
+        event = {'op': op, 'at': datetime.now().isoformat()}
+        event.update(fields)
+        line = (json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self.lock_for(username):
+            with open(self.journal_path(username), 'ab+') as f:
+                # 上次追加被中断时先补上换行，避免新事件接在损坏的行后面
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        line = b'\n' + line
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                size = f.tell()
+            self.appended += 1
+        if size >= self.compact_bytes:
+            self._schedule_compaction(username)
+        return event
+
+    def load(self, username):
+        """Materialise the current document, or None if the user does not exist"""
+        with self.lock_for(username):
+            try:
+                with open(self.document_path(username), 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+            except FileNotFoundError:
+                return None
+            for event in self._read_journal(username):
+                try:
+                    apply_event(document, event)
+                except (KeyError, TypeError, AttributeError) as e:
+                    print(f"[Evaluators] 无法应用日志事件 {event.get('op')}: {username}, 错误: {str(e)}")
+            return document
+
+    def _read_journal(self, username):
+        path = self.journal_path(username)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        events = []
+        for number, line in enumerate(lines, 1):
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                if number < len(lines):
+                    print(f"[Evaluators] 跳过损坏的日志行: {path}:{number}")
+        return events
+
+    def _write_document(self, username, document):
+        path = self.document_path(username)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def compact(self, username):
+        """Fold the journal of ``username`` into the base document"""
+        with self.lock_for(username):
+            if not os.path.exists(self.journal_path(username)):
+                return False
+            document = self.load(username)
+            if document is None:
+                return False
+            self._write_document(username, document)
+            os.remove(self.journal_path(username))
+            self.compactions += 1
+            return True
+
+    def _schedule_compaction(self, username):
+        self._compact_queue.put(username)
+        with self._locks_lock:
+            if self._compactor is None:
+                self._compactor = threading.Thread(
+                    target=self._run_compactor, name='evaluator-compactor', daemon=True)
+                self._compactor.start()
+
+    def _run_compactor(self):
+        while True:
+            username = self._compact_queue.get()
+            try:
+                self.compact(username)
+            except Exception as e:
+                print(f"[Evaluators] 合并日志失败: {username}, 错误: {str(e)}")
+
+    def usernames(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.evaluators_dir)
+                      if name.endswith('.json'))
+
+    def case_results(self, case_id):
+        """Scores, rankings and feedback of every evaluator for one case"""
+        return _collect_case_results(self.usernames(), self.load, case_id)
+
+    def snapshot(self):
+        return {
+            'storage': 'json',
+            'appended': self.appended,
+            'compactions': self.compactions,
+            'pending_compactions': self._compact_queue.qsize()
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    created_at TEXT,
+    updated_at TEXT,
+    submitted_at TEXT,
+    data TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS dimension_scores (
+    username TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    evaluator_id TEXT NOT NULL,
+    dimension_key TEXT NOT NULL,
+    score TEXT NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (username, case_id, evaluator_id, dimension_key)
+);
+CREATE INDEX IF NOT EXISTS idx_dimension_scores_case
+    ON dimension_scores (case_id, evaluator_id);
+CREATE TABLE IF NOT EXISTS rankings (
+    username TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    ranking TEXT,
+    tiers TEXT,
+    PRIMARY KEY (username, case_id)
+);
+CREATE INDEX IF NOT EXISTS idx_rankings_case ON rankings (case_id);
+CREATE TABLE IF NOT EXISTS feedback (
+    username TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    evaluator_id TEXT NOT NULL,
+    feedback TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (username, case_id, evaluator_id)
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_case ON feedback (case_id);
+CREATE TABLE IF NOT EXISTS case_states (
+    username TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    has_results INTEGER NOT NULL DEFAULT 0,
+    has_feedback INTEGER NOT NULL DEFAULT 0,
+    saved INTEGER,
+    saved_at TEXT,
+    extra TEXT,
+    PRIMARY KEY (username, case_id)
+);
+CREATE INDEX IF NOT EXISTS idx_case_states_case ON case_states (case_id);
+"""
+
+_USER_COLUMNS = ('created_at', 'updated_at', 'submitted_at')
+_USER_TABLES = ('dimension_scores', 'rankings', 'feedback', 'case_states')
+
+
+class SQLiteEvaluatorStore:
+    """Evaluator documents kept in indexed SQLite tables
+
+    Each event is applied in its own transaction, touching only the rows
+    it changes. ``load`` reassembles the document in the JSON layout;
+    values the tables do not model (extra keys under a case or an
+    evaluator) are kept as JSON in ``case_states.extra``. Connections are
+    per thread and the database runs in WAL mode so reads do not block
+    writers.
+    """
+
+    def __init__(self, db_path, fsync=True):
+        self.db_path = db_path
+        self.fsync = fsync
+        self._local = threading.local()
+        self.appended = 0
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, apply, *args):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = apply(conn, *args)
+            conn.execute('COMMIT')
+            return result
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def signature(self, username):
+        # 数据库只由本进程写入，缓存不需要检测外部修改
+        return None
+
+    def exists(self, username):
+        row = self._connection().execute(
+            'SELECT 1 FROM users WHERE username = ?', (username,)).fetchone()
+        return row is not None
+
+    def create(self, username, document):
+        """Store ``document`` as the whole state of ``username``"""
+        self._transaction(self._replace_document, username, document)
+
+    def append(self, username, op, **fields):
+        """Apply one change in a transaction; returns the event"""
+        if op not in EVENT_HANDLERS:
+            raise KeyError(op)
+        event = {'op': op, 'at': datetime.now().isoformat()}
+        event.update(fields)
+        self._transaction(getattr(self, f'_apply_{op}'), username, event)
+        self.appended += 1
+        return event
+
+    # 各事件对应的SQL操作，语义与EVENT_HANDLERS一致
+
+    def _touch_case(self, conn, username, case_id, results=0, feedback=0):
+        conn.execute(
+            'INSERT INTO case_states (username, case_id, has_results, has_feedback) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (username, case_id) DO UPDATE SET '
+            'has_results = max(has_results, excluded.has_results), '
+            'has_feedback = max(has_feedback, excluded.has_feedback)',
+            (username, case_id, results, feedback))
+
+    def _touch_user(self, conn, username, at):
+        conn.execute('UPDATE users SET updated_at = ? WHERE username = ?', (at, username))
+
+    def _set_score(self, conn, username, case_id, evaluator_id, dimension_key, score, at):
+        conn.execute(
+            'INSERT INTO dimension_scores VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (username, case_id, evaluator_id, dimension_key) DO UPDATE SET '
+            'score = excluded.score, updated_at = excluded.updated_at',
+            (username, case_id, evaluator_id, dimension_key,
+             json.dumps(score, ensure_ascii=False), at))
+
+    def _merge_extra(self, conn, username, case_id, extra):
+        row = conn.execute('SELECT extra FROM case_states WHERE username = ? AND case_id = ?',
+                           (username, case_id)).fetchone()
+        merged = json.loads(row[0]) if row and row[0] else {}
+        for key, value in extra.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key].update(value)
+            else:
+                merged[key] = value
+        conn.execute('UPDATE case_states SET extra = ? WHERE username = ? AND case_id = ?',
+                     (json.dumps(merged, ensure_ascii=False), username, case_id))
+
+    def _apply_update(self, conn, username, event):
+        row = conn.execute('SELECT data FROM users WHERE username = ?', (username,)).fetchone()
+        data = json.loads(row[0]) if row else {}
+        for key, value in event['fields'].items():
+            if key in _USER_COLUMNS:
+                conn.execute(f'UPDATE users SET {key} = ? WHERE username = ?', (value, username))
+            elif key != 'username':
+                data[key] = value
+        conn.execute('UPDATE users SET data = ? WHERE username = ?',
+                     (json.dumps(data, ensure_ascii=False), username))
+
+    def _apply_submit(self, conn, username, event):
+        conn.execute('DELETE FROM dimension_scores WHERE username = ?', (username,))
+        conn.execute('DELETE FROM rankings WHERE username = ?', (username,))
+        conn.execute('UPDATE case_states SET has_results = 0, saved = NULL, saved_at = NULL, '
+                     'extra = NULL WHERE username = ?', (username,))
+        self._import_results(conn, username, event['evaluation_results'], event['at'])
+        conn.execute('UPDATE users SET submitted_at = ? WHERE username = ?',
+                     (event['at'], username))
+
+    def _apply_dimension_score(self, conn, username, event):
+        self._touch_case(conn, username, event['case_id'], results=1)
+        self._set_score(conn, username, event['case_id'], event['evaluator_id'],
+                        event['dimension_key'], event['score'], event['at'])
+        self._touch_user(conn, username, event['at'])
+
+    def _apply_dimension_scores(self, conn, username, event):
+        for item in event['scores']:
+            self._touch_case(conn, username, item['case_id'], results=1)
+            self._set_score(conn, username, item['case_id'], item['evaluator_id'],
+                            item['dimension_key'], item['score'], event['at'])
+        self._touch_user(conn, username, event['at'])
+
+    def _apply_feedback(self, conn, username, event):
+        self._touch_case(conn, username, event['case_id'], feedback=1)
+        conn.execute(
+            'INSERT INTO feedback VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (username, case_id, evaluator_id) DO UPDATE SET '
+            'feedback = excluded.feedback, updated_at = excluded.updated_at',
+            (username, event['case_id'], event['evaluator_id'], event['feedback'], event['at']))
+        self._touch_user(conn, username, event['at'])
+
+    def _apply_initialize_case(self, conn, username, event):
+        self._touch_case(conn, username, event['case_id'], results=1, feedback=1)
+        self._touch_user(conn, username, event['at'])
+
+    def _apply_ranking(self, conn, username, event):
+        self._touch_case(conn, username, event['case_id'], results=1)
+        conn.execute(
+            'INSERT INTO rankings VALUES (?, ?, ?, ?) ON CONFLICT (username, case_id) '
+            'DO UPDATE SET ranking = excluded.ranking, tiers = excluded.tiers',
+            (username, event['case_id'], json.dumps(event['ranking'], ensure_ascii=False),
+             json.dumps(event['tiers'], ensure_ascii=False)))
+        conn.execute('UPDATE case_states SET saved_at = ? WHERE username = ? AND case_id = ?',
+                     (event['at'], username, event['case_id']))
+
+    def _apply_case_state(self, conn, username, event):
+        case_id = event['case_id']
+        self._touch_case(conn, username, case_id, results=1)
+        conn.execute('UPDATE case_states SET saved = 1, saved_at = ? '
+                     'WHERE username = ? AND case_id = ?', (event['at'], username, case_id))
+        conn.execute(
+            'INSERT INTO rankings (username, case_id, ranking) VALUES (?, ?, ?) '
+            'ON CONFLICT (username, case_id) DO UPDATE SET ranking = excluded.ranking',
+            (username, case_id, json.dumps(event['ranking'], ensure_ascii=False)))
+        extra = {}
+        for evaluator_id, evaluator_data in event['evaluators'].items():
+            for dimension_key, score in evaluator_data['dimensions'].items():
+                self._set_score(conn, username, case_id, evaluator_id,
+                                dimension_key, score, event['at'])
+            rest = {key: value for key, value in evaluator_data.items() if key != 'dimensions'}
+            if rest:
+                extra[evaluator_id] = rest
+        if extra:
+            self._merge_extra(conn, username, case_id, extra)
+
+    def _import_results(self, conn, username, results, at):
+        for case_id, case_results in results.items():
+            if not isinstance(case_results, dict):
+                print(f"[Evaluators] 跳过无法识别的评估结果: {username} - {case_id}")
+                continue
+            self._touch_case(conn, username, case_id, results=1)
+            extra = {}
+            for key, value in case_results.items():
+                if key in ('saved', 'saved_at', 'ranking', 'tiers'):
+                    continue
+                if isinstance(value, dict) and isinstance(value.get('dimensions'), dict):
+                    for dimension_key, score in value['dimensions'].items():
+                        self._set_score(conn, username, case_id, key, dimension_key, score, at)
+                    rest = {k: v for k, v in value.items() if k != 'dimensions'}
+                    if rest:
+                        extra[key] = rest
+                else:
+                    extra[key] = value
+            if 'ranking' in case_results or 'tiers' in case_results:
+                conn.execute('INSERT OR REPLACE INTO rankings VALUES (?, ?, ?, ?)', (
+                    username, case_id,
+                    json.dumps(case_results['ranking'], ensure_ascii=False)
+                    if 'ranking' in case_results else None,
+                    json.dumps(case_results['tiers'], ensure_ascii=False)
+                    if 'tiers' in case_results else None))
+            conn.execute(
+                'UPDATE case_states SET saved = ?, saved_at = ?, extra = ? '
+                'WHERE username = ? AND case_id = ?',
+                (int(bool(case_results['saved'])) if 'saved' in case_results else None,
+                 case_results.get('saved_at'),
+                 json.dumps(extra, ensure_ascii=False) if extra else None,
+                 username, case_id))
+
+    def _replace_document(self, conn, username, document):
+        conn.execute('DELETE FROM users WHERE username = ?', (username,))
+        for table in _USER_TABLES:
+            conn.execute(f'DELETE FROM {table} WHERE username = ?', (username,))
+        data = {key: value for key, value in document.items()
+                if key not in _USER_COLUMNS + ('username', 'evaluation_results', 'feedback')}
+        conn.execute('INSERT INTO users VALUES (?, ?, ?, ?, ?)', (
+            username, document.get('created_at'), document.get('updated_at'),
+            document.get('submitted_at'), json.dumps(data, ensure_ascii=False)))
+        self._import_results(conn, username, document.get('evaluation_results') or {},
+                             document.get('updated_at'))
+        for case_id, entries in (document.get('feedback') or {}).items():
+            if not isinstance(entries, dict):
+                continue
+            self._touch_case(conn, username, case_id, feedback=1)
+            for evaluator_id, text in entries.items():
+                conn.execute('INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?, ?)',
+                             (username, case_id, evaluator_id, text, document.get('updated_at')))
+
+    def load(self, username):
+        """Reassemble the document of ``username`` in the JSON layout"""
+        conn = self._connection()
+        row = conn.execute('SELECT created_at, updated_at, submitted_at, data FROM users '
+                           'WHERE username = ?', (username,)).fetchone()
+        if row is None:
+            return None
+        document = {'username': username}
+        document.update(json.loads(row[3]))
+        for column, value in zip(_USER_COLUMNS, row[:3]):
+            if value is not None:
+                document[column] = value
+
+        results = {}
+        feedback = {}
+        extras = {}
+        for case_id, has_results, has_feedback, saved, saved_at, extra in conn.execute(
+                'SELECT case_id, has_results, has_feedback, saved, saved_at, extra '
+                'FROM case_states WHERE username = ?', (username,)):
+            if has_feedback:
+                feedback.setdefault(case_id, {})
+            if not has_results:
+                continue
+            entry = results.setdefault(case_id, {})
+            if saved is not None:
+                entry['saved'] = bool(saved)
+            if saved_at is not None:
+                entry['saved_at'] = saved_at
+            if extra:
+                extras[case_id] = json.loads(extra)
+        for case_id, ranking, tiers in conn.execute(
+                'SELECT case_id, ranking, tiers FROM rankings WHERE username = ?', (username,)):
+            entry = results.setdefault(case_id, {})
+            if ranking is not None:
+                entry['ranking'] = json.loads(ranking)
+            if tiers is not None:
+                entry['tiers'] = json.loads(tiers)
+        for case_id, evaluator_id, dimension_key, score in conn.execute(
+                'SELECT case_id, evaluator_id, dimension_key, score FROM dimension_scores '
+                'WHERE username = ?', (username,)):
+            evaluator = results.setdefault(case_id, {}).setdefault(evaluator_id, {'dimensions': {}})
+            evaluator['dimensions'][dimension_key] = json.loads(score)
+        for case_id, extra in extras.items():
+            entry = results.setdefault(case_id, {})
+            for key, value in extra.items():
+                if isinstance(value, dict) and isinstance(entry.get(key), dict):
+                    entry[key].update(value)
+                else:
+                    entry[key] = value
+        for case_id, evaluator_id, text in conn.execute(
+                'SELECT case_id, evaluator_id, feedback FROM feedback WHERE username = ?',
+                (username,)):
+            feedback.setdefault(case_id, {})[evaluator_id] = text
+
+        # A submit always leaves both keys in the JSON layout, even when empty
+        if results or 'submitted_at' in document:
+            document['evaluation_results'] = results
+        if feedback or 'submitted_at' in document:
+            document['feedback'] = feedback
+        return document
+
+    def usernames(self):
+        return [row[0] for row in self._connection().execute(
+            'SELECT username FROM users ORDER BY username')]
+
+    def case_results(self, case_id):
+        """Scores, rankings and feedback of every evaluator for one case"""
+        conn = self._connection()
+        results = {}
+
+        def entry(username):
+            return results.setdefault(username, {
+                'scores': {}, 'ranking': None, 'tiers': None, 'saved': False, 'feedback': {}})
+
+        for username, saved in conn.execute(
+                'SELECT username, saved FROM case_states WHERE case_id = ? AND has_results = 1',
+                (case_id,)):
+            entry(username)['saved'] = bool(saved)
+        for username, evaluator_id, dimension_key, score in conn.execute(
+                'SELECT username, evaluator_id, dimension_key, score FROM dimension_scores '
+                'WHERE case_id = ?', (case_id,)):
+            scores = entry(username)['scores']
+            scores.setdefault(evaluator_id, {})[dimension_key] = json.loads(score)
+        for username, ranking, tiers in conn.execute(
+                'SELECT username, ranking, tiers FROM rankings WHERE case_id = ?', (case_id,)):
+            entry(username).update({
+                'ranking': json.loads(ranking) if ranking is not None else None,
+                'tiers': json.loads(tiers) if tiers is not None else None
+            })
+        for username, evaluator_id, text in conn.execute(
+                'SELECT username, evaluator_id, feedback FROM feedback WHERE case_id = ?',
+                (case_id,)):
+            entry(username)['feedback'][evaluator_id] = text
+        return dict(sorted(results.items()))
+
+    def snapshot(self):
+        conn = self._connection()
+        return {
+            'storage': 'sqlite',
+            'db_path': self.db_path,
+            'appended': self.appended,
+            'users': conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+            'dimension_scores': conn.execute(
+                'SELECT COUNT(*) FROM dimension_scores').fetchone()[0]
+        }
+
+
+class CachedEvaluatorStore:
+    """Write-through LRU cache of materialised documents in front of a backend
+
+    ``load`` serves cached documents as long as the backend's
+    ``signature(username)`` (a stat of the user's files for the JSON
+    backend) is unchanged, so edits made outside the service are picked
+    up on the next read. Every ``append`` goes to the backend first and
+    is then applied copy-on-write (``apply_event_copy``) to the cached
+    document, which it replaces; documents returned by ``load`` share
+    their unchanged parts and must be treated as read-only.
+    """
+
+    def __init__(self, store, max_entries=256):
+        self.store = store
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _user_lock(self, username):
+        with self._lock:
+            lock = self._user_locks.get(username)
+            if lock is None:
+                lock = self._user_locks[username] = threading.RLock()
+            return lock
+
+    def _get(self, username, signature):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            if entry[0] != signature:
+                del self._entries[username]
+                self.invalidations += 1
+                return None
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def _put(self, username, signature, document):
+        with self._lock:
+            self._entries[username] = (signature, document)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def load(self, username):
+        signature = self.store.signature(username)
+        document = self._get(username, signature)
+        if document is not None:
+            self.hits += 1
+            return document
+        self.misses += 1
+        with self._user_lock(username):
+            # 先取签名再读取：读取期间文件被修改时，下次读取会发现签名不一致
+            signature = self.store.signature(username)
+            document = self.store.load(username)
+            if document is not None:
+                self._put(username, signature, document)
+            return document
+
+    def exists(self, username):
+        return self.store.exists(username)
+
+    def create(self, username, document):
+        with self._user_lock(username):
+            self.store.create(username, document)
+            self._put(username, self.store.signature(username), copy.deepcopy(document))
+
+    def append(self, username, op, **fields):
+        with self._user_lock(username):
+            before = self.store.signature(username)
+            event = self.store.append(username, op, **fields)
+            with self._lock:
+                entry = self._entries.get(username)
+            if entry is None:
+                return event
+            if entry[0] != before:
+                self._drop(username)
+                return event
+            try:
+                document = apply_event_copy(entry[1], event)
+            except (KeyError, TypeError, AttributeError):
+                self._drop(username)
+                return event
+            self._put(username, self.store.signature(username), document)
+            return event
+
+    def usernames(self):
+        return self.store.usernames()
+
+    def case_results(self, case_id):
+        if isinstance(self.store, EvaluatorJournal):
+            # JSON后端需要逐个读取文档，改为从缓存读取
+            return _collect_case_results(self.usernames(), self.load, case_id)
+        return self.store.case_results(case_id)
+
+    def snapshot(self):
+        snapshot = self.store.snapshot()
+        with self._lock:
+            snapshot['cache'] = {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+        return snapshot
+
+
+def event_fields(op, fields):
+    """Names of the document fields an event changes, for conflict checks"""
+    case_id = fields.get('case_id')
+    if op == 'dimension_score':
+        return [f"dimension/{case_id}/{fields['evaluator_id']}/{fields['dimension_key']}"]
+    if op == 'dimension_scores':
+        return [name for item in fields['scores']
+                for name in event_fields('dimension_score', item)]
+    if op == 'feedback':
+        return [f"feedback/{case_id}/{fields['evaluator_id']}"]
+    if op == 'ranking':
+        return [f'ranking/{case_id}']
+    if op == 'case_state':
+        names = [f'ranking/{case_id}', f'saved/{case_id}']
+        for evaluator_id, evaluator_data in fields['evaluators'].items():
+            names.extend(f'dimension/{case_id}/{evaluator_id}/{dimension_key}'
+                         for dimension_key in evaluator_data['dimensions'])
+        return names
+    if op == 'update':
+        return ['user']
+    if op == 'submit':
+        return ['*']
+    return []
+
+
+class VersionConflict(Exception):
+    """A write based on an old version touches fields changed since then"""
+
+    def __init__(self, fields, version):
+        super().__init__(f'字段已被修改: {", ".join(fields)}')
+        self.fields = fields
+        self.version = version
+
+
+class VersionedEvaluatorStore:
+    """Per-user locks and optimistic version checks in front of a backend
+
+    Every user document has its own lock, so evaluators never wait for
+    each other, and a version that grows with every change. Writers may
+    pass the ``base_version`` they read together with a ``writer`` id
+    (one per browser tab). A stale write is merged when the fields it
+    touches (see ``event_fields``) were not changed by another writer
+    after ``base_version``, e.g. two tabs scoring different dimensions;
+    otherwise ``VersionConflict`` is raised and nothing is written.
+
+    Versions are only tracked in memory and carry a per-process epoch;
+    base versions from before a restart are accepted without a check.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.epoch = uuid.uuid4().hex[:8]
+        self._users = {}
+        self._users_lock = threading.Lock()
+        self.merged = 0
+        self.conflicts = 0
+
+    def _state(self, username):
+        with self._users_lock:
+            state = self._users.get(username)
+            if state is None:
+                state = self._users[username] = {
+                    'lock': threading.RLock(), 'version': 0, 'changed': {}}
+            return state
+
+    def lock_for(self, username):
+        return self._state(username)['lock']
+
+    def version(self, username):
+        return f"{self.epoch}.{self._state(username)['version']}"
+
+    def _parse_version(self, base_version):
+        epoch, _, number = str(base_version).partition('.')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def _conflicting(self, state, names, base, writer):
+        newer = {name: changed_by for name, (version, changed_by) in state['changed'].items()
+                 if version > base and changed_by != writer}
+        if not newer:
+            return []
+        if '*' in names or '*' in newer:
+            return sorted(newer)
+        return [name for name in names if name in newer]
+
+    def append(self, username, op, base_version=None, writer=None, **fields):
+        state = self._state(username)
+        names = event_fields(op, fields)
+        with state['lock']:
+            base = self._parse_version(base_version) if base_version is not None else None
+            if base is not None and base < state['version']:
+                conflicts = self._conflicting(state, names, base, writer)
+                if conflicts:
+                    self.conflicts += 1
+                    raise VersionConflict(conflicts, self.version(username))
+                self.merged += 1
+            event = self.store.append(username, op, **fields)
+            state['version'] += 1
+            for name in names:
+                state['changed'][name] = (state['version'], writer)
+            return event
+
+    def append_scores(self, username, scores, atomic=False):
+        """Write many dimension scores as one ``dimension_scores`` event
+
+        Each item holds case_id, evaluator_id, dimension_key and score, and
+        optionally its own base_version and writer, checked as in
+        ``append``. Returns a list aligned with ``scores``: None for items
+        that were written, the ``VersionConflict`` for rejected ones. With
+        ``atomic`` a single conflict rejects the whole list.
+        """
+        state = self._state(username)
+        with state['lock']:
+            new_version = state['version'] + 1
+            changed = dict(state['changed'])
+            accepted = []
+            results = []
+            for item in scores:
+                fields = {key: item[key] for key in
+                          ('case_id', 'evaluator_id', 'dimension_key', 'score')}
+                names = event_fields('dimension_score', fields)
+                base = (self._parse_version(item['base_version'])
+                        if item.get('base_version') is not None else None)
+                # 同一批中先写入的项也参与后面各项的冲突检查
+                conflicts = []
+                if base is not None and base < new_version:
+                    conflicts = self._conflicting({'changed': changed}, names, base,
+                                                  item.get('writer'))
+                if conflicts:
+                    results.append(VersionConflict(conflicts, self.version(username)))
+                    continue
+                if base is not None and base < state['version']:
+                    self.merged += 1
+                accepted.append(fields)
+                results.append(None)
+                for name in names:
+                    changed[name] = (new_version, item.get('writer'))
+
+            rejected = len(accepted) < len(scores)
+            if rejected:
+                self.conflicts += 1
+            if rejected and atomic:
+                error = next(result for result in results if result is not None)
+                return [error] * len(scores)
+            if accepted:
+                self.store.append(username, 'dimension_scores', scores=accepted)
+                state['version'] = new_version
+                state['changed'] = changed
+            return results
+
+    def create(self, username, document):
+        state = self._state(username)
+        with state['lock']:
+            self.store.create(username, document)
+            state['version'] += 1
+            state['changed'] = {'*': (state['version'], None)}
+
+    def load(self, username):
+        return self.store.load(username)
+
+    def exists(self, username):
+        return self.store.exists(username)
+
+    def usernames(self):
+        return self.store.usernames()
+
+    def case_results(self, case_id):
+        return self.store.case_results(case_id)
+
+    def snapshot(self):
+        snapshot = self.store.snapshot()
+        snapshot['versions'] = {
+            'epoch': self.epoch,
+            'users': len(self._users),
+            'merged_writes': self.merged,
+            'conflicts': self.conflicts
+        }
+        return snapshot
+
+
+class ScoreCommitter:
+    """Group commit of single dimension-score saves
+
+    Saves of the same user that arrive within ``window`` seconds of each
+    other are written as one ``append_scores`` call (one journal line and
+    one fsync, or one SQLite transaction). The first request of a window
+    waits out the window and then commits everything queued meanwhile;
+    every ``submit`` returns only after its own score is durable, or
+    raises its ``VersionConflict``.
+    """
+
+    def __init__(self, store, window=0.05):
+        self.store = store
+        self.window = window
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.commits = 0
+
+    def submit(self, username, case_id, evaluator_id, dimension_key, score,
+               base_version=None, writer=None):
+        waiter = {
+            'item': {'case_id': case_id, 'evaluator_id': evaluator_id,
+                     'dimension_key': dimension_key, 'score': score,
+                     'base_version': base_version, 'writer': writer},
+            'done': threading.Event(),
+            'error': None
+        }
+        with self._lock:
+            self.requests += 1
+            queued = self._pending.get(username)
+            leader = queued is None
+            if leader:
+                queued = self._pending[username] = []
+            queued.append(waiter)
+        if leader:
+            time.sleep(self.window)
+            self._commit(username)
+        waiter['done'].wait()
+        if waiter['error'] is not None:
+            raise waiter['error']
+
+    def _commit(self, username):
+        with self._lock:
+            batch = self._pending.pop(username)
+            self.commits += 1
+        try:
+            results = self.store.append_scores(
+                username, [waiter['item'] for waiter in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for waiter, result in zip(batch, results):
+            waiter['error'] = result
+            waiter['done'].set()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'window': self.window,
+                'requests': self.requests,
+                'commits': self.commits
+            }
+
+
+def create_evaluator_store(storage, evaluators_dir, db_path, compact_bytes=64 * 1024,
+                           fsync=True, cache_entries=0):
+    """Open the backend selected by ``storage`` ('json' or 'sqlite')
+
+    With ``cache_entries`` > 0 the backend is wrapped in a
+    ``CachedEvaluatorStore`` of that size; the result is always wrapped
+    in a ``VersionedEvaluatorStore``.
+    """
+    if storage == 'sqlite':
+        store = SQLiteEvaluatorStore(db_path, fsync=fsync)
+    elif storage == 'json':
+        store = EvaluatorJournal(evaluators_dir, compact_bytes=compact_bytes, fsync=fsync)
+    else:
+        raise ValueError(f'未知的评估数据存储方式: {storage}')
+    if cache_entries > 0:
+        store = CachedEvaluatorStore(store, max_entries=cache_entries)
+    return VersionedEvaluatorStore(store)
+
+
+def import_json(evaluators_dir, db_path):
+    """Copy every evaluator document (with pending journal events) into SQLite
+
+    Users already in the database are replaced, so the import can be re-run.
+    """
+    source = EvaluatorJournal(evaluators_dir)
+    target = SQLiteEvaluatorStore(db_path)
+    count = 0
+    for username in source.usernames():
+        document = source.load(username)
+        if document is None:
+            continue
+        target.create(username, document)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评估数据存储工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import-json', help='把evaluators目录的JSON文件导入SQLite')
+    import_parser.add_argument('--evaluators', default=os.environ.get(
+        'EVALUATORS_DIR') or './evaluators')
+    import_parser.add_argument('--db', default=os.environ.get(
+        'EVALUATION_DB_PATH') or './evaluations.db')
+    args = parser.parse_args()
+
+    if args.command == 'import-json':
+        count = import_json(args.evaluators, args.db)
+        print(f"已导入 {count} 个评估者到 {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+(?:[-+][a-z0-9]+)*')
+
+# Words that carry no signal for picking an examination section
+_STOPWORDS = {
+    'a', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'can', 'could', 'did',
+    'do', 'does', 'for', 'from', 'have', 'how', 'i', 'in', 'is', 'it', 'me',
+    'my', 'of', 'on', 'or', 'please', 'result', 'results', 'show', 'test',
+    'tests', 'the', 'there', 'to', 'was', 'were', 'what', 'with', 'you',
+    'your', 'level', 'levels', 'value', 'values', 'function', 'examination',
+    'exam', 'findings', 'done', 'performed', 'had'
+}
+
+# Common ways doctors refer to examinations, mapped to words that appear in
+# prompt3 section names or item keys
+SYNONYMS = {
+    'cbc': ['blood', 'count', 'wbc', 'hgb', 'hb'],
+    'hemogram': ['blood', 'count'],
+    'bloodwork': ['blood'],
+    'labs': ['blood'],
+    'ecg': ['electrocardiogram'],
+    'ekg': ['electrocardiogram'],
+    'us': ['ultrasound'],
+    'sonography': ['ultrasound'],
+    'echo': ['ultrasound', 'echocardiography'],
+    'echocardiogram': ['echocardiography', 'ultrasound'],
+    'scan': ['ct', 'mri', 'ultrasound'],
+    'imaging': ['ct', 'mri', 'ultrasound', 'x-ray', 'radiograph'],
+    'xray': ['x-ray'],
+    'endoscopy': ['gastroscopy', 'colonoscopy'],
+    'amylase': ['amy', 'uamy'],
+    'lipase': ['amylase'],
+    'liver': ['alt', 'ast', 'tbil', 'dbil', 'ggt'],
+    'kidney': ['renal', 'bun', 'cr', 'creatinine'],
+    'renal': ['bun', 'cr', 'creatinine'],
+    'sodium': ['na'],
+    'potassium': ['k'],
+    'chloride': ['cl'],
+    'bilirubin': ['tbil', 'dbil'],
+    'sugar': ['glucose'],
+    'clotting': ['coagulation'],
+    'temperature': ['physical'],
+    'pulse': ['physical'],
+    'vital': ['physical'],
+    'vitals': ['physical'],
+    'pressure': ['physical'],
+    'auscultation': ['physical'],
+    'palpation': ['physical'],
+    'percussion': ['physical'],
+    'tenderness': ['physical'],
+    'abdomen': ['physical'],
+    'abdominal': ['physical'],
+    'heart': ['physical'],
+    'lungs': ['physical'],
+    'bowel': ['physical'],
+    'ascites': ['physical'],
+    'murmur': ['physical'],
+    'rales': ['physical'],
+    'jaundice': ['physical']
+}
+
+
+EXAM_SUBSET_HEADER = (
+    "Examination results relevant to the doctor's current question. "
+    "Only these sections are listed for this turn:\n"
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    words = _WORD_PATTERN.findall((text or '').lower())
+    return [w for w in words if w not in _STOPWORDS]
+
+
+def _section_terms(name, value):
+    terms = set(tokenize(name))
+    if isinstance(value, dict):
+        for item_key in value.keys():
+            terms.update(tokenize(item_key))
+    # Parenthesised abbreviations such as "Serum Amylase (AMY)"
+    terms.update(w.lower() for w in re.findall(r'\(([^)]+)\)', name))
+    return terms
+
+
+class ExamIndex:
+    """Keyword index over the sections of a case's prompt3 examination dict"""
+
+    def __init__(self, exam_data):
+        self.sections = []
+        self.full_content = json.dumps(exam_data or {}, ensure_ascii=False)
+        for name, value in (exam_data or {}).items():
+            self.sections.append({
+                'name': name,
+                'value': value,
+                'terms': _section_terms(name, value),
+                'name_terms': _section_terms(name, None),
+                'items': [(item_key, _singular_terms(tokenize(item_key)))
+                          for item_key in value.keys()] if isinstance(value, dict) else [],
+                'content': json.dumps({name: value}, ensure_ascii=False)
+            })
+
+    def match(self, question):
+        """Return the names of sections relevant to the question"""
+        words = tokenize(question)
+        expanded = set(words)
+        for word in words:
+            expanded.update(SYNONYMS.get(word, []))
+        return [section['name'] for section in self.sections
+                if section['terms'] & expanded]
+
+    def select(self, question):
+        """Build the exam content for one question
+
+        Returns ``(content, matched_names)``. When no section matches, the
+        full dump is returned and ``matched_names`` is empty.
+        """
+        matched = self.match(question)
+        if not matched:
+            return self.full_content, []
+        parts = [section['content'] for section in self.sections
+                 if section['name'] in matched]
+        return EXAM_SUBSET_HEADER + "\n".join(parts), matched
+
+
+# Words signalling that the doctor is asking for a stored result
+RESULT_CUES = {
+    'result', 'results', 'test', 'tests', 'level', 'levels', 'value',
+    'values', 'report', 'findings', 'show', 'showed', 'examination',
+    'examinations', 'exam', 'check', 'provide', 'scan'
+}
+
+
+def _singular_terms(words):
+    terms = set(words)
+    terms.update(w[:-1] for w in words if len(w) > 3 and w.endswith('s'))
+    return terms
+
+
+# Separators between the individual examinations in one request
+# ("ultrasound, gastroscopy and abdominal CT")
+_REQUEST_SEPARATORS = re.compile(r'[,;/&]|\band\b|\bor\b|\bplus\b')
+
+# SYNONYMS entries that name a related but different test; they are fine
+# for picking sections to show the LLM but must not be answered directly
+_RELATED_TESTS = {'lipase'}
+
+
+class ExamFastPath:
+    """Answer plain requests for stored exam results without calling the LLM
+
+    The question is split into the examinations it asks for ("ultrasound,
+    gastroscopy and abdominal CT"). Each of them must map onto a prompt3
+    section name, item key or abbreviation; if any does not, the whole
+    question is forwarded so that no requested result is silently left
+    out. Every matched section is answered. On top of that, either every
+    content word must be explained, or the question must contain a result
+    cue ("results", "level", ...) and at least half of its content words
+    must be explained. Physical examination findings are only returned
+    when asked for by name, because targeted questions about them ("bowel
+    sounds?") need the LLM to pick out the relevant part.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.forwarded = 0
+
+    def answer(self, exam_index, question):
+        """Return a patient reply built from prompt3, or None to forward"""
+        reply = self._build_answer(exam_index, question) if exam_index else None
+        with self._lock:
+            if reply:
+                self.matched += 1
+            else:
+                self.forwarded += 1
+        return reply
+
+    def _expand(self, word):
+        if word in _RELATED_TESTS:
+            return {word}
+        targets = {t for t in SYNONYMS.get(word, []) if t != 'physical'}
+        return _singular_terms([word]) | targets
+
+    def _match_request(self, exam_index, words):
+        """Sections answering one requested examination
+
+        Returns ``[(section, section_hits, item_keys)]`` for the sections
+        explaining the most words of the request. Ties go to the section
+        matched by the later word, i.e. the head noun of phrases such as
+        "abdominal ultrasound"; sections still tied are all returned.
+        """
+        best_key = None
+        best = []
+        for section in exam_index.sections:
+            name_terms = _singular_terms(section['name_terms'])
+            section_hits = set()
+            item_hits = []
+            last_position = -1
+            for position, word in enumerate(words):
+                candidates = self._expand(word)
+                hit = False
+                if candidates & name_terms:
+                    section_hits.add(word)
+                    hit = True
+                for item_key, item_terms in section['items']:
+                    if candidates & item_terms:
+                        item_hits.append((word, item_key))
+                        hit = True
+                if hit:
+                    last_position = position
+            explained = section_hits | {w for w, _ in item_hits}
+            if not explained:
+                continue
+            key = (len(explained), last_position)
+            match = (section, section_hits, [k for _, k in item_hits], explained)
+            if best_key is None or key > best_key:
+                best_key = key
+                best = [match]
+            elif key == best_key:
+                best.append(match)
+        return best
+
+    def _build_answer(self, exam_index, question):
+        raw_words = set(_WORD_PATTERN.findall((question or '').lower()))
+        words = tokenize(question)
+        if not words:
+            return None
+
+        selected = OrderedDict()
+        explained = set()
+        for request in _REQUEST_SEPARATORS.split((question or '').lower()):
+            request_words = [w for w in tokenize(request) if w not in RESULT_CUES]
+            if not request_words:
+                continue
+            matches = self._match_request(exam_index, request_words)
+            if not matches:
+                return None
+            for section, section_hits, item_keys, request_explained in matches:
+                entry = selected.setdefault(section['name'], (section, set(), []))
+                entry[1].update(section_hits)
+                entry[2].extend(item_keys)
+                explained.update(request_explained)
+
+        if not selected:
+            return None
+
+        explained.update(w for w in words if w in RESULT_CUES)
+        coverage = len(explained & set(words)) / len(set(words))
+        has_cue = bool(raw_words & RESULT_CUES)
+        if not (coverage == 1 or (has_cue and coverage >= 0.5)):
+            return None
+
+        parts = []
+        for section in exam_index.sections:
+            if section['name'] not in selected:
+                continue
+            _, section_hits, item_keys = selected[section['name']]
+            value = section['value']
+            if isinstance(value, dict):
+                if section_hits or not item_keys:
+                    items = list(value.items())
+                else:
+                    items = [(k, value[k]) for k in dict.fromkeys(item_keys)]
+                listed = ", ".join(f"{k} {v}" for k, v in items)
+                parts.append(f"The {section['name']} results are: {listed}.")
+            else:
+                parts.append(f"The {section['name']} showed: {value}.")
+        return " ".join(parts)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.matched + self.forwarded
+            return {
+                'matched': self.matched,
+                'forwarded': self.forwarded,
+                'match_rate': round(self.matched / total, 3) if total else None
+            }
+
+
+class ExamIndexStats:
+    """Counters for how often the index replaced the full exam dump"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.index_hits = 0
+        self.full_fallbacks = 0
+        self.chars_saved = 0
+
+    def record(self, matched, full_length, sent_length):
+        with self._lock:
+            if matched:
+                self.index_hits += 1
+                self.chars_saved += max(0, full_length - sent_length)
+            else:
+                self.full_fallbacks += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.index_hits + self.full_fallbacks
+            return {
+                'index_hits': self.index_hits,
+                'full_fallbacks': self.full_fallbacks,
+                'hit_rate': round(self.index_hits / total, 3) if total else None,
+                'chars_saved': self.chars_saved
+            }
@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class GatewayBusyError(Exception):
+    """Raised when the gateway queue is full and a call is rejected"""
+
+
+class GatewayTimeoutError(Exception):
+    """Raised when a call does not finish within its timeout"""
+
+
+_STREAM_END = object()
+
+
+class LLMGateway:
+    """In-process gateway for outbound LLM calls
+
+    Calls run on a bounded worker pool. At most ``max_in_flight`` calls are
+    executed concurrently, up to ``max_queue`` further calls wait in the
+    queue, and anything beyond that is rejected immediately with
+    GatewayBusyError so callers see back-pressure instead of piling up.
+    """
+
+    def __init__(self, max_in_flight=8, max_queue=32, timeout=60, latency_window=200):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix='llm-gateway')
+        self._admission = threading.BoundedSemaphore(max_in_flight + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'timed_out': 0
+        }
+        self._latencies = deque(maxlen=latency_window)
+        self._queue_waits = deque(maxlen=latency_window)
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit a call and return a Future, rejecting it if the queue is full"""
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise GatewayBusyError(
+                f"LLM gateway is busy ({self.max_in_flight} in flight, {self.max_queue} queued)")
+
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self._counters['submitted'] += 1
+            self._queued += 1
+
+        def run():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+                self._queue_waits.append(started_at - enqueued_at)
+            try:
+                result = fn(*args, **kwargs)
+                with self._lock:
+                    self._counters['completed'] += 1
+                return result
+            except Exception:
+                with self._lock:
+                    self._counters['failed'] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._latencies.append(time.perf_counter() - started_at)
+                self._admission.release()
+
+        future = self._executor.submit(run)
+        future.add_done_callback(self._release_cancelled)
+        return future
+
+    def _release_cancelled(self, future):
+        """Give back the slot of a call cancelled before it started
+
+        ``run`` never executes for such calls, so its ``finally`` cannot
+        release the admission slot.
+        """
+        if not future.cancelled():
+            return
+        with self._lock:
+            self._queued -= 1
+        self._admission.release()
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Submit a call and wait for its result"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._counters['timed_out'] += 1
+            raise GatewayTimeoutError(
+                f"LLM call did not finish within {timeout or self.timeout}s")
+
+    def stream(self, fn, *args, timeout=None, **kwargs):
+        """Run an iterator-producing call on the pool and yield its items
+
+        The worker holds its in-flight slot until the stream is exhausted,
+        so long generations count against the concurrency limit.
+        """
+        items = queue.Queue()
+        timeout = timeout or self.timeout
+
+        def pump():
+            try:
+                for item in fn(*args, **kwargs):
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+                raise
+            finally:
+                items.put(_STREAM_END)
+
+        future = self.submit(pump)
+        while True:
+            try:
+                item = items.get(timeout=timeout)
+            except queue.Empty:
+                future.cancel()
+                with self._lock:
+                    self._counters['timed_out'] += 1
+                raise GatewayTimeoutError(
+                    f"LLM stream stalled for more than {timeout}s")
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def metrics(self):
+        """Snapshot of queue depth, concurrency and latency statistics"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            queue_waits = sorted(self._queue_waits)
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout,
+                'in_flight': self._in_flight,
+                'queue_depth': self._queued,
+                **self._counters,
+                'latency_ms': _summarize(latencies),
+                'queue_wait_ms': _summarize(queue_waits)
+            }
+
+
+def _summarize(samples):
+    if not samples:
+        return {'count': 0, 'avg': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'count': len(samples),
+        'avg': round(sum(samples) / len(samples) * 1000, 1),
+        'p50': round(samples[len(samples) // 2] * 1000, 1),
+        'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+        'max': round(samples[-1] * 1000, 1)
+    }
@@ -0,0 +1,87 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession(requests.Session):
+    """Shared keep-alive session for LLM traffic
+
+    openai 0.28 keeps one session per thread and closes it every few
+    minutes. Installing a single PooledSession as ``openai.requestssession``
+    makes every worker thread draw from the same thread-safe urllib3
+    connection pool, and ``close()`` is a no-op so that periodic recycling
+    does not drop the warm connections. Use ``shutdown()`` to really close.
+    """
+
+    def __init__(self, pool_size=8, max_retries=2):
+        super().__init__()
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=max_retries,
+            pool_block=False
+        )
+        self.mount('https://', self._adapter)
+        self.mount('http://', self._adapter)
+        self._prewarm_lock = threading.Lock()
+        self._prewarmed = 0
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+    def prewarm(self, base_url, api_key=None, connections=1, timeout=5):
+        """Open keep-alive connections to the LLM host ahead of the first call
+
+        Runs the requests in background threads and returns immediately.
+        The response status is irrelevant; only the TCP/TLS handshake matters.
+        """
+        if not base_url:
+            return
+
+        headers = {'Authorization': f'Bearer {api_key}'} if api_key else {}
+        url = base_url.rstrip('/') + '/models'
+
+        def warm():
+            try:
+                self.get(url, headers=headers, timeout=timeout).close()
+                with self._prewarm_lock:
+                    self._prewarmed += 1
+            except requests.RequestException as e:
+                print(f"[AI] 连接预热失败: {str(e)}")
+
+        # Only open as many connections as the pool does not already hold
+        missing = max(0, connections - self.metrics()['idle_connections'])
+        for _ in range(missing):
+            threading.Thread(target=warm, daemon=True).start()
+
+    def metrics(self):
+        """Connection counts across all host pools of this session"""
+        connections = 0
+        requests_sent = 0
+        idle = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+            if pool.pool is not None:
+                # The pool queue is pre-filled with None placeholders
+                idle += sum(1 for conn in list(pool.pool.queue)
+                            if conn is not None)
+        with self._prewarm_lock:
+            prewarmed = self._prewarmed
+        return {
+            'pool_size': self.pool_size,
+            'connections_opened': connections,
+            'requests_sent': requests_sent,
+            'connections_reused': max(0, requests_sent - connections),
+            'idle_connections': idle,
+            'prewarmed': prewarmed
+        }
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+CATEGORIES = ['symptom', 'sign', 'examination', 'history', 'other']
+
+# Keyword rules per category. English entries are matched on word
+# boundaries (a trailing '*' allows any suffix), Chinese entries as substrings.
+KEYWORDS = {
+    'symptom': [
+        'pain*', 'ache*', 'hurt*', 'nause*', 'vomit*', 'fever*', 'dizz*',
+        'tired*', 'fatigue*', 'cough*', 'bloat*', 'distension', 'tight*',
+        'palpitation*', 'shortness of breath', 'breathless*', 'faint*',
+        'syncope', 'sweat*', 'itch*', 'diarrh*', 'constipat*', 'headache*',
+        'weak*', 'swell*', 'feel*', 'felt', 'uncomfortable', 'discomfort',
+        'chills', 'appetite',
+        '疼', '痛', '不适', '发烧', '发热', '胸闷', '心悸', '气短', '呼吸困难',
+        '晕厥', '恶心', '呕吐', '乏力', '头晕', '腹胀'
+    ],
+    'sign': [
+        'temperature', 'blood pressure', 'pulse', 'heart rate', 'respiration',
+        'auscultation', 'murmur*', 'tenderness', 'rebound', 'palpable',
+        'percussion', 'bowel sounds', 'rales', 'edema', 'oedema', 'mmhg',
+        'beats/min', 'breaths/min', 'rigidity', 'shifting dullness',
+        'discoloration', 'heart sounds', 'breath sounds',
+        '体温', '血压', '心率', '听诊', '杂音', '心界', '压痛', '体征', '肺部'
+    ],
+    'examination': [
+        'test*', 'result*', 'wbc', 'ct', 'ultrasound', 'ecg', 'ekg',
+        'electrocardiogram', 'x-ray', 'mri', 'gastroscopy', 'endoscopy',
+        'amylase', 'lab*', 'mmol/l', 'μmol/l', 'u/l', 'iu/l', 'g/l',
+        'echocardiograph*', 'troponin', 'marker*', 'thyroid', 'scan*',
+        'blood count', 'imaging', 'biopsy', 'urinalysis', 'd-dimer',
+        '检查', '血常规', '心电图', '超声', '化验', '指标', '影像'
+    ],
+    'history': [
+        'history', 'family', 'mother', 'father', 'parents', 'smok*',
+        'cigarette*', 'alcohol', 'drink*', 'drank', 'surgery', 'surgeries',
+        'operation*', 'medication*', 'medicine*', 'allerg*', 'married',
+        'work*', 'job', 'diet', 'hereditary', 'years ago', 'previously',
+        'previous', 'childhood', 'vaccinat*', 'occupation',
+        '病史', '家族', '吸烟', '饮酒', '手术', '用药', '过敏', '遗传'
+    ],
+    'other': [
+        'thank*', 'hello', "don't know", 'not sure', 'not been performed',
+        'not performed', "haven't had", 'no idea', 'goodbye',
+        '谢谢', '不知道', '没做过'
+    ]
+}
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_TOKEN_PATTERN = re.compile(r"[a-z][a-z'\-]*|[\u4e00-\u9fff]")
+
+
+def _compile_keyword(keyword):
+    if _CJK_PATTERN.search(keyword):
+        return re.compile(re.escape(keyword))
+    if keyword.endswith('*'):
+        return re.compile(r'(?<![a-z])' + re.escape(keyword[:-1]) + r'[a-z]*')
+    return re.compile(r'(?<![a-z])' + re.escape(keyword) + r'(?![a-z])')
+
+
+_KEYWORD_PATTERNS = {
+    category: [_compile_keyword(k) for k in keywords]
+    for category, keywords in KEYWORDS.items()
+}
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall((text or '').lower())
+
+
+def content_hash(text):
+    """Stable cache key for a message's exact content"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def rule_scores(text):
+    """Number of keyword hits per category"""
+    lowered = (text or '').lower()
+    return {category: sum(1 for p in patterns if p.search(lowered))
+            for category, patterns in _KEYWORD_PATTERNS.items()}
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes over word tokens, updatable one label at a time"""
+
+    def __init__(self):
+        self.class_counts = Counter()
+        self.token_counts = defaultdict(Counter)
+        self.token_totals = Counter()
+        self.vocabulary = set()
+
+    @property
+    def size(self):
+        return sum(self.class_counts.values())
+
+    def add(self, text, category):
+        tokens = tokenize(text)
+        self.class_counts[category] += 1
+        self.token_counts[category].update(tokens)
+        self.token_totals[category] += len(tokens)
+        self.vocabulary.update(tokens)
+
+    def predict_proba(self, text):
+        tokens = tokenize(text)
+        total = self.size
+        vocab_size = len(self.vocabulary) + 1
+        log_probs = {}
+        for category in CATEGORIES:
+            count = self.class_counts[category]
+            log_prob = math.log((count + 1) / (total + len(CATEGORIES)))
+            denominator = self.token_totals[category] + vocab_size
+            for token in tokens:
+                log_prob += math.log(
+                    (self.token_counts[category][token] + 1) / denominator)
+            log_probs[category] = log_prob
+        top = max(log_probs.values())
+        exp = {c: math.exp(v - top) for c, v in log_probs.items()}
+        norm = sum(exp.values())
+        return {c: v / norm for c, v in exp.items()}
+
+
+class MessageClassifier:
+    """Local classifier for AI patient replies
+
+    Combines keyword rules with a naive Bayes model trained on labels the
+    LLM classifier produced earlier. ``classify`` returns the label and
+    its confidence; callers fall back to the LLM when the confidence is
+    below ``threshold`` and feed the LLM's answer back through ``learn``.
+    """
+
+    def __init__(self, labels_file=None, threshold=0.75, min_training_labels=30):
+        self.labels_file = labels_file
+        self.threshold = threshold
+        self.min_training_labels = min_training_labels
+        self.model = NaiveBayesModel()
+        self._lock = threading.Lock()
+        self.local_count = 0
+        self.fallback_count = 0
+        if labels_file and os.path.exists(labels_file):
+            self._load_labels()
+
+    def _load_labels(self):
+        loaded = 0
+        with open(self.labels_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('category') in CATEGORIES and record.get('text'):
+                    self.model.add(record['text'], record['category'])
+                    loaded += 1
+        print(f"[Classifier] 从 {self.labels_file} 加载 {loaded} 条训练标签")
+
+    def classify(self, text):
+        """Return ``(category, confidence)`` from rules and the trained model"""
+        scores = rule_scores(text)
+        smoothed = {c: scores[c] + 0.1 for c in CATEGORIES}
+        norm = sum(smoothed.values())
+        distribution = {c: v / norm for c, v in smoothed.items()}
+
+        with self._lock:
+            if (self.model.size >= self.min_training_labels
+                    and len(self.model.class_counts) > 1):
+                nb = self.model.predict_proba(text)
+                distribution = {c: (distribution[c] + nb[c]) / 2
+                                for c in CATEGORIES}
+
+        category = max(CATEGORIES, key=lambda c: distribution[c])
+        return category, distribution[category]
+
+    def is_confident(self, confidence):
+        return confidence >= self.threshold
+
+    def record(self, local):
+        with self._lock:
+            if local:
+                self.local_count += 1
+            else:
+                self.fallback_count += 1
+
+    def learn(self, text, category):
+        """Add an LLM-produced label to the model and the labels file"""
+        if category not in CATEGORIES or not text:
+            return
+        with self._lock:
+            self.model.add(text, category)
+            if self.labels_file:
+                try:
+                    with open(self.labels_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps({'text': text, 'category': category},
+                                           ensure_ascii=False) + '\n')
+                except OSError as e:
+                    print(f"[Classifier] 保存训练标签失败: {str(e)}")
+
+    def snapshot(self):
+        with self._lock:
+            total = self.local_count + self.fallback_count
+            return {
+                'local': self.local_count,
+                'llm_fallback': self.fallback_count,
+                'local_rate': round(self.local_count / total, 3) if total else None,
+                'training_labels': self.model.size,
+                'threshold': self.threshold
+            }
+
+
+# Tag the chat model is asked to end its reply with when the category is
+# produced in the same completion, e.g. "[category: symptom]"
+CATEGORY_TAG = '[category:'
+_CATEGORY_TAG_PATTERN = re.compile(r'\[category:\s*([a-z]+)\s*\]?', re.IGNORECASE)
+
+
+class ReplyCategorySplitter:
+    """Separate the trailing category tag from a (streamed) reply
+
+    ``feed`` returns the part of each delta that is safe to show; text that
+    might be the start of the tag is held back until it is clear either
+    way. ``finish`` returns the held-back reply text and the category, or
+    None when the model gave no valid tag.
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._tail = None
+
+    def feed(self, delta):
+        if self._tail is not None:
+            self._tail += delta
+            return ''
+        self._pending += delta
+        lowered = self._pending.lower()
+        index = lowered.find(CATEGORY_TAG)
+        if index >= 0:
+            text = self._pending[:index]
+            self._tail = self._pending[index:]
+            self._pending = ''
+            return text
+        keep = 0
+        for length in range(min(len(CATEGORY_TAG) - 1, len(lowered)), 0, -1):
+            if lowered.endswith(CATEGORY_TAG[:length]):
+                keep = length
+                break
+        text = self._pending[:len(self._pending) - keep]
+        self._pending = self._pending[len(self._pending) - keep:]
+        return text
+
+    def finish(self):
+        text, self._pending = self._pending, ''
+        match = _CATEGORY_TAG_PATTERN.match(self._tail or '')
+        category = match.group(1).lower() if match else None
+        return text, category if category in CATEGORIES else None
+
+
+def split_reply_category(reply):
+    """``(reply without the category tag, category or None)``"""
+    splitter = ReplyCategorySplitter()
+    text = splitter.feed(reply)
+    rest, category = splitter.finish()
+    return (text + rest).rstrip(), category
@@ -5,11 +5,25 @@ from datetime import datetime
 import openai
 import json
 from flask_cors import CORS
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context
 from config import get_config
+from llm_gateway import LLMGateway, GatewayBusyError, GatewayTimeoutError
+from llm_session import PooledSession
+from context_window import build_context, pending_summary_turns, build_summary_prompt, estimate_tokens
+from exam_index import ExamIndex, ExamIndexStats, ExamFastPath
+from answer_cache import AnswerCache, TTLCache
+from message_classifier import (MessageClassifier, CATEGORIES, content_hash,
+                                ReplyCategorySplitter, split_reply_category)
+from case_store import (CaseRegistry, CaseWatcher, CompletionIndex, load_case,
+                        open_bundle)
+from user_events import UserEventHub
+from session_store import SessionStore
 import sys
 import io
 import os
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Configure stdout and stderr to use UTF-8 encoding for Chinese characters
@@ -71,8 +85,12 @@ print(f"[Startup]   OPENAI_BASE_URL: {openai_base_url or '❌ NOT SET'}")
 print(
     f"[Startup]   OPENAI_API_KEY: {'✓ SET' if openai_api_key else '❌ NOT SET'}")
 print(f"[Startup]   CONVERSATIONS_DIR: {config.CONVERSATIONS_DIR}")
+print(f"[Startup]   CASE_BUNDLE_PATH: {config.CASE_BUNDLE_PATH}")
 print(f"[Startup] ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
 
+# 加载预编译的病例数据包（不存在时回退到conversations目录结构）
+open_bundle(config.CASE_BUNDLE_PATH)
+
 # 验证必要的配置是否存在
 config_errors = []
 if not openai_model:
@@ -97,64 +115,194 @@ config.init_app(app)
 
 CORS(app, origins=config.CORS_ORIGINS)
 
+# Bounded worker pool for all outbound LLM calls
+llm_gateway = LLMGateway(
+    max_in_flight=config.LLM_MAX_IN_FLIGHT,
+    max_queue=config.LLM_MAX_QUEUE,
+    timeout=config.LLM_TIMEOUT
+)
+
+# Shared keep-alive connection pool used by the openai client in every thread
+llm_session = PooledSession(pool_size=config.LLM_POOL_SIZE)
+openai.requestssession = llm_session
+
 # User state management - store each user's state using username as key
-user_states = {}
+# (user_states is created after the helpers it needs, below)
 user_states_lock = threading.Lock()
 
-# Global variable to store case file list for each user
-user_case_files = {}
+# Case list shared by all users, rescanned once per change of conversations/
+case_registry = CaseRegistry(config.CONVERSATIONS_DIR, config.CASE_BUNDLE_PATH)
+
+# Which cases each user has already saved, kept in sync with the registry
+completion_index = CompletionIndex()
+
+# Push notifications (/api/events) for case changes, saves and replies
+user_events = UserEventHub()
+
+# Per-case prompt3 indexes, keyed by case file
+exam_indexes = {}
+exam_indexes_lock = threading.Lock()
+exam_index_stats = ExamIndexStats()
+exam_fast_path = ExamFastPath()
+
+# Local classifier for /classify-message, trained from earlier LLM labels
+message_classifier = MessageClassifier(
+    labels_file=config.CLASSIFIER_LABELS_FILE,
+    threshold=config.CLASSIFIER_CONFIDENCE_THRESHOLD)
+
+# Classification results keyed by message content hash
+classification_cache = TTLCache(
+    max_entries=config.CLASSIFICATION_CACHE_MAX_ENTRIES,
+    ttl=config.CLASSIFICATION_CACHE_TTL)
+
+# Patient answers shared across users working on the same case
+answer_cache = AnswerCache(max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+                           ttl=config.ANSWER_CACHE_TTL)
+
+
+def new_user_state():
+    return {
+        'message_history': [],
+        'current_case_index': 0,
+        'user_dir': None,
+        'case_data': None,
+        'initialized': False,
+        'case_key': None,
+        'exam_index': None,
+        'user_id': None,  # 保留user_id用于其他用途
+        'summary': None,  # 较早对话的滚动摘要 {'content', 'covered'}
+        'summary_pending': False,
+        'state_version': 0  # 用户可见状态变化时递增，用于轮询接口的ETag
+    }
 
 
 def get_user_state(username):
-    """获取或创建用户状态，使用username作为键"""
+    """获取或创建用户状态，使用username作为键
+
+    长时间未访问的用户状态会被写入磁盘，这里会透明地恢复。
+    """
+    return user_states.get_or_create(username)
+
+
+def dehydrate_user_state(user_state):
+    """写入磁盘的用户状态：病例数据和检查索引可以重新加载，不保存"""
+    return {key: value for key, value in user_state.items()
+            if key not in ('case_data', 'exam_index', 'summary_pending')}
+
+
+def rehydrate_user_state(username, saved):
+    """从磁盘快照恢复用户状态，并重新加载病例数据"""
+    user_state = new_user_state()
+    user_state.update(saved)
+    if user_state['case_key']:
+        # 快照期间案例列表可能变化，按案例文件夹重新定位
+        case_index = case_registry.snapshot.index_of(
+            user_state['case_key'].split('/')[0])
+        if case_index is not None:
+            user_state['current_case_index'] = case_index
+    if user_state['initialized']:
+        user_state['case_data'] = load_medical_case(
+            username, user_state['current_case_index'])
+        if user_state['case_data'] is not None and user_state['case_key']:
+            user_state['exam_index'] = get_exam_index(
+                user_state['case_key'], user_state['case_data'])
+    print(f"[Sessions] 恢复用户 {username} 的会话，"
+          f"{len(user_state['message_history'])} 条消息")
+    return user_state
+
+
+def user_state_size(user_state):
+    """估算用户状态占用的内存（消息和摘要的字符数）"""
+    size = sum(len(message.get('content') or '')
+               for message in user_state['message_history'])
+    if user_state['summary']:
+        size += len(user_state['summary'].get('content') or '')
+    return size
+
+
+user_states = SessionStore(
+    'analysis', new_user_state, dehydrate_user_state, rehydrate_user_state,
+    sizeof=user_state_size,
+    max_entries=config.SESSION_MAX_ENTRIES,
+    max_bytes=config.SESSION_MAX_BYTES,
+    idle_ttl=config.SESSION_IDLE_TTL,
+    min_idle=config.SESSION_MIN_IDLE,
+    spill_dir=config.SESSION_SPILL_DIR)
+
+
+def bump_state_version(user_state):
+    """记录用户可见状态的变化，使之前发出的ETag失效"""
     with user_states_lock:
-        if username not in user_states:
-            user_states[username] = {
-                'message_history': [],
-                'current_case_index': 0,
-                'user_dir': None,
-                'case_data': None,
-                'initialized': False,
-                'user_id': None  # 保留user_id用于其他用途
-            }
-        return user_states[username]
+        user_state['state_version'] += 1
 
 
-def get_user_case_files(username):
-    """获取conversations文件夹下的所有case文件夹"""
-    global user_case_files
+# 每个进程启动时生成，重启后计数器从头开始，旧的ETag不会再匹配
+boot_id = uuid.uuid4().hex[:8]
 
-    if username not in user_case_files:
-        # 从conversations文件夹下获取所有case文件夹
-        conversations_dir = config.CONVERSATIONS_DIR
 
-        # 获取conversations文件夹下的所有第一层目录（case文件夹）
-        if os.path.exists(conversations_dir):
-            all_items = os.listdir(conversations_dir)
-            # 过滤出是目录且名称为caseX的文件夹
-            case_folders = [item for item in all_items
-                            if os.path.isdir(os.path.join(conversations_dir, item))
-                            and item.startswith('case')]
+def state_etag(user_state, *parts):
+    """由进程启动标识、用户状态版本和案例列表版本生成轮询接口的ETag"""
+    values = (boot_id, user_state['state_version'], case_registry.version) + parts
+    return '-'.join(str(value) for value in values)
 
-            # 按数字顺序排序 (case10, case11, etc.)
-            case_folders = sorted(case_folders, key=lambda x: int(
-                x.replace('case', '')))
 
-            # 构建对应的json文件名列表 (case10.json, case11.json, etc.)
-            case_files = [f"{folder}/{folder}.json" for folder in case_folders]
+def notify_user(username, event, **data):
+    """向该用户所有打开的推送连接发送事件"""
+    user_events.publish(username, event, data)
+
+
+def not_modified(etag):
+    """客户端的If-None-Match与当前状态一致时返回空的304响应"""
+    return with_etag(Response(status=304), etag)
+
+
+def with_etag(response, etag):
+    """附上ETag，并要求浏览器每次都带If-None-Match重新验证"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-            user_case_files[username] = case_files
-            print(f"从conversations文件夹获取的案例文件: {user_case_files[username]}")
-        else:
-            user_case_files[username] = []
-            print(f"警告：conversations文件夹不存在: {conversations_dir}")
 
-    return user_case_files[username]
+def get_case_files():
+    """获取所有用户共享的案例文件列表（格式为 "case10/case10.json"）"""
+    return case_registry.snapshot.case_files
+
+
+def on_cases_changed(old_snapshot, new_snapshot, changed_folders):
+    """案例列表变化后更新完成索引，并让正在作答的用户停留在原来的案例上"""
+    completion_index.update_folders(new_snapshot, changed_folders)
+
+    states = user_states.items()
+    for username, user_state in states:
+        if not user_state['case_key']:
+            continue
+        new_index = new_snapshot.index_of(user_state['case_key'].split('/')[0])
+        if new_index is not None and new_index != user_state['current_case_index']:
+            print(f"用户 {username} 的案例 {user_state['case_key']} 索引变化: "
+                  f"{user_state['current_case_index']} -> {new_index}")
+            user_state['current_case_index'] = new_index
+            # 前端订阅推送时不再轮询，必须通知它更新病例索引，
+            # 否则保存对话时会使用旧索引写入错误的案例文件夹
+            bump_state_version(user_state)
+            notify_user(username, 'case', case_index=new_index,
+                        case_file=user_state['case_key'])
+
+
+case_registry.add_listener(on_cases_changed)
+case_registry.refresh()
+if not case_registry.snapshot.folders:
+    print(f"警告：未找到任何案例（数据包或conversations文件夹）: {config.CONVERSATIONS_DIR}")
+case_watcher = None
+if config.CASE_WATCH_ENABLED:
+    case_watcher = CaseWatcher(case_registry, config.CASE_WATCH_INTERVAL).start()
 
 
 def load_medical_case(username, case_index):
-    """加载指定用户的指定索引的病例文件"""
-    case_files = get_user_case_files(username)
+    """加载指定用户的指定索引的病例文件
+
+    通过进程内共享的病例缓存读取，返回的数据为只读，不要修改。
+    """
+    case_files = get_case_files()
 
     if case_index >= len(case_files):
         print(
@@ -162,57 +310,75 @@ def load_medical_case(username, case_index):
         return None
 
     # 从conversations文件夹下加载case文件
-    conversations_dir = config.CONVERSATIONS_DIR
-    case_file_path = os.path.join(conversations_dir, case_files[case_index])
+    case_folder = case_files[case_index].split('/')[0]
+    data = load_case(config.CONVERSATIONS_DIR, case_folder)
+    if data is None:
+        print(f"错误：病例文件不存在或无法解析: {case_files[case_index]}")
+    return data
 
-    print(f"尝试加载病例文件: {case_file_path}")
 
-    if not os.path.exists(case_file_path):
-        print(f"错误：病例文件不存在: {case_file_path}")
-        return None
+# Replies returned by get_response() when no completion could be produced
+LLM_BUSY_REPLY = "AI service is busy. Please try again in a moment."
+LLM_UNAVAILABLE_REPLY = "AI service is currently unavailable. Please try again later."
+LLM_CONFIG_ERROR_PREFIX = "Configuration Error:"
 
-    try:
-        with open(case_file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            print(f"成功加载病例文件: {case_file_path}")
-            return data
-    except Exception as e:
-        print(f"加载病例文件失败: {case_file_path}, 错误: {str(e)}")
-        return None
+
+def is_llm_error_reply(reply):
+    """判断get_response()的返回值是否为错误提示而非模型回复"""
+    return (reply in (LLM_BUSY_REPLY, LLM_UNAVAILABLE_REPLY)
+            or reply.startswith(LLM_CONFIG_ERROR_PREFIX))
+
+
+def check_llm_config():
+    """Verify LLM configuration, raising ValueError when something is missing"""
+    if not config.OPENAI_MODEL:
+        raise ValueError(
+            "OPENAI_MODEL is not configured. Please check your .env file.")
+    if not config.OPENAI_API_KEY:
+        raise ValueError(
+            "OPENAI_API_KEY is not configured. Please check your .env file.")
+    if not config.OPENAI_BASE_URL:
+        raise ValueError(
+            "OPENAI_BASE_URL is not configured. Please check your .env file.")
+
+
+def build_completion_request(messages, **overrides):
+    """Build chat completion arguments
+
+    Credentials are passed per call instead of being written to the
+    module-global openai client, so concurrent calls never race on them.
+    """
+    params = {
+        'model': config.OPENAI_MODEL,
+        'messages': messages,
+        'max_tokens': 2000,
+        'temperature': 0.7,
+        'api_key': config.OPENAI_API_KEY,
+        'api_base': config.OPENAI_BASE_URL,
+        'request_timeout': config.LLM_TIMEOUT
+    }
+    params.update(overrides)
+    return params
 
 
 def get_response(messages):
     """Get AI response from LLM"""
     try:
-        # Verify configuration
-        if not config.OPENAI_MODEL:
-            raise ValueError(
-                "OPENAI_MODEL is not configured. Please check your .env file.")
-        if not config.OPENAI_API_KEY:
-            raise ValueError(
-                "OPENAI_API_KEY is not configured. Please check your .env file.")
-        if not config.OPENAI_BASE_URL:
-            raise ValueError(
-                "OPENAI_BASE_URL is not configured. Please check your .env file.")
-
-        # Set API configuration
-        openai.api_key = config.OPENAI_API_KEY
-        openai.api_base = config.OPENAI_BASE_URL
+        check_llm_config()
 
         print(f"[AI] Calling OpenAI API with model: {config.OPENAI_MODEL}")
 
-        # Create chat completion request
-        response = openai.ChatCompletion.create(
-            model=config.OPENAI_MODEL,
-            messages=messages,
-            max_tokens=2000,
-            temperature=0.7
-        )
+        # Create chat completion request through the gateway
+        response = llm_gateway.call(
+            openai.ChatCompletion.create, **build_completion_request(messages))
 
         return response.choices[0].message.content
     except ValueError as ve:
         print(f"[AI] Configuration Error: {str(ve)}")
-        return f"Configuration Error: {str(ve)}"
+        return f"{LLM_CONFIG_ERROR_PREFIX} {str(ve)}"
+    except (GatewayBusyError, GatewayTimeoutError) as ge:
+        print(f"[AI] Gateway Error: {str(ge)}")
+        return LLM_BUSY_REPLY
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -220,7 +386,110 @@ def get_response(messages):
         print(f"[AI] Error calling LLM API:")
         print(f"[AI]   Error: {error_msg}")
         print(f"[AI]   Traceback:\n{tb}")
-        return "AI service is currently unavailable. Please try again later."
+        return LLM_UNAVAILABLE_REPLY
+
+
+def stream_response(messages):
+    """Stream AI response from LLM, yielding content deltas as they arrive"""
+    check_llm_config()
+
+    print(f"[AI] Streaming OpenAI API with model: {config.OPENAI_MODEL}")
+
+    def iter_deltas():
+        response = openai.ChatCompletion.create(
+            **build_completion_request(messages, stream=True))
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+    yield from llm_gateway.stream(iter_deltas)
+
+
+def sse_event(data, event=None):
+    """Format a server-sent event"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+def get_exam_index(case_key, case_data):
+    """获取病例prompt3的检查结果索引，病例数据变化时重建"""
+    with exam_indexes_lock:
+        entry = exam_indexes.get(case_key)
+        if entry is None or entry['case_data'] is not case_data:
+            entry = {
+                'case_data': case_data,
+                'index': ExamIndex(case_data.get("prompt3", {}))
+            }
+            exam_indexes[case_key] = entry
+        return entry['index']
+
+
+def build_prompt(username):
+    """Build the messages sent to the LLM for the user's latest question"""
+    user_state = get_user_state(username)
+    messages, context_stats = build_context(
+        user_state['message_history'], config.CONTEXT_TOKEN_BUDGET,
+        summary=user_state['summary'])
+
+    exam_index = user_state.get('exam_index')
+    if config.EXAM_INDEX_ENABLED and exam_index is not None:
+        question = user_state['message_history'][-1].get('content', '')
+        exam_content, matched = exam_index.select(question)
+        exam_index_stats.record(matched, len(exam_index.full_content),
+                                len(exam_content))
+        if matched:
+            # 用相关检查段落替换完整的prompt3系统消息
+            messages = [
+                {"role": "system", "content": exam_content}
+                if m.get('role') == 'system' and m.get('content') == exam_index.full_content
+                else m
+                for m in messages
+            ]
+            context_stats['prompt_tokens'] -= (
+                estimate_tokens(exam_index.full_content) - estimate_tokens(exam_content))
+        context_stats['exam_sections'] = matched
+
+    print(
+        f"[AI] 用户 {username} 请求prompt约 {context_stats['prompt_tokens']} tokens，"
+        f"省略 {context_stats['turns_dropped']} 条较早消息")
+    return messages, context_stats
+
+
+def answer_from_exam_results(username, question):
+    """检查结果类问题直接从prompt3作答，无法确定时返回None交给LLM"""
+    if not config.EXAM_FAST_PATH_ENABLED:
+        return None
+    reply = exam_fast_path.answer(
+        get_user_state(username).get('exam_index'), question)
+    if reply:
+        print(f"[AI] 用户 {username} 的问题由检查结果直接作答")
+    return reply
+
+
+def get_answer_cache_key(username):
+    """当前问题在跨用户回答缓存中的键，缓存关闭时返回None"""
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    user_state = get_user_state(username)
+    return AnswerCache.make_key(user_state.get('case_key'),
+                                user_state['message_history'])
+
+
+def answer_without_llm(username, question):
+    """尝试不调用LLM直接作答，返回 (回复, 来源)，无法作答时回复为None"""
+    reply = answer_from_exam_results(username, question)
+    if reply:
+        return reply, 'exam_results'
+    reply = answer_cache.get(get_answer_cache_key(username))
+    if reply:
+        print(f"[AI] 用户 {username} 的问题命中回答缓存")
+        return reply, 'cache'
+    return None, 'llm'
 
 
 def initialize_case(username):
@@ -232,10 +501,19 @@ def initialize_case(username):
             username, user_state['current_case_index'])
 
     user_state['message_history'] = []
+    user_state['summary'] = None
 
     exam_content = json.dumps(
         user_state['case_data']["prompt3"], ensure_ascii=False)
 
+    case_files = get_case_files()
+    case_index = user_state['current_case_index']
+    case_key = case_files[case_index] if case_index < len(
+        case_files) else str(case_index)
+    user_state['case_key'] = case_key
+    user_state['exam_index'] = get_exam_index(
+        case_key, user_state['case_data'])
+
     user_state['message_history'].extend([
         {"role": "system", "content": user_state['case_data']["prompt1"]},
         {"role": "system", "content": user_state['case_data']["prompt2"]},
@@ -244,6 +522,53 @@ def initialize_case(username):
     ])
 
     user_state['initialized'] = True
+    bump_state_version(user_state)
+    notify_user(username, 'case', case_index=case_index,
+                case_file=case_key)
+
+
+def schedule_history_summary(username):
+    """在后台把较早的对话轮次合并进滚动摘要，不阻塞当前回复"""
+    if not config.CONTEXT_SUMMARY_ENABLED:
+        return
+
+    user_state = get_user_state(username)
+    if user_state['summary_pending']:
+        return
+
+    history = user_state['message_history']
+    previous = user_state['summary']
+    turns = pending_summary_turns(
+        history, previous, config.CONTEXT_SUMMARY_KEEP_MESSAGES)
+    if len(turns) < config.CONTEXT_SUMMARY_MIN_MESSAGES:
+        return
+
+    covered = (previous['covered'] if previous else 0) + len(turns)
+    prompt = build_summary_prompt(
+        previous['content'] if previous else None, turns)
+
+    def summarize():
+        try:
+            response = openai.ChatCompletion.create(**build_completion_request(
+                prompt, max_tokens=600, temperature=0))
+            content = response.choices[0].message.content.strip()
+            # 案例切换后历史列表会被替换，此时丢弃过期的摘要
+            if content and user_state['message_history'] is history:
+                user_state['summary'] = {
+                    'content': content, 'covered': covered}
+                print(f"[AI] 用户 {username} 对话摘要已更新，覆盖 {covered} 条消息")
+        except Exception as e:
+            print(f"[AI] 用户 {username} 生成对话摘要失败: {str(e)}")
+        finally:
+            user_state['summary_pending'] = False
+
+    try:
+        check_llm_config()
+        user_state['summary_pending'] = True
+        llm_gateway.submit(summarize)
+    except (ValueError, GatewayBusyError) as e:
+        user_state['summary_pending'] = False
+        print(f"[AI] 跳过对话摘要: {str(e)}")
 
 
 def get_user_dir(username):
@@ -260,50 +585,25 @@ def get_next_case_index(username):
     """获取用户下一个未完成case的索引
 
     逻辑：
-    1. 遍历所有案例文件夹，检查用户是否有保存的对话记录（文件名为{username}.json）
+    1. 根据完成索引判断用户在哪些案例文件夹中保存过对话记录（文件名为{username}.json）
     2. 返回第一个没有作答过的案例索引（从0开始）
     3. 如果都作答过，返回最后一个案例索引
     """
-    # 获取案例文件列表
-    case_files = get_user_case_files(username)
-    total_cases = len(case_files)
+    # 从内存中的完成索引查找，不再逐个检查 {username}.json 是否存在
+    next_index = completion_index.next_incomplete(
+        username, case_registry.snapshot.folders)
 
-    if total_cases == 0:
+    if next_index is None:
         print(f"未找到任何案例文件")
         return 0
 
-    # 统计每个case文件夹中是否有该用户的JSON文件
-    conversations_dir = config.CONVERSATIONS_DIR
-    completed_case_indices = set()
-
-    # 期望的用户保存文件名
-    expected_filename = f"{username}.json"
-
-    for idx, case_file_path in enumerate(case_files):
-        # case_files 中的文件名格式为 "case10/case10.json"
-        case_folder = case_file_path.split('/')[0]
-        case_dir = os.path.join(conversations_dir, case_folder)
-
-        if os.path.exists(case_dir):
-            # 精确查找该用户的json文件 (filename == "{username}.json")
-            user_file_path = os.path.join(case_dir, expected_filename)
-            if os.path.exists(user_file_path):
-                completed_case_indices.add(idx)
-
-    # 从索引0开始，找到第一个未完成的案例
-    for idx in range(total_cases):
-        if idx not in completed_case_indices:
-            return idx
-
-    # 如果所有案例都完成了，返回最后一个案例索引
-    last_idx = total_cases - 1
-    return last_idx
+    return next_index
 
 
 def get_previous_case_index(username):
     """获取用户上一个案例的索引（允许返回任何前面的案例，不仅仅是已完成的）"""
     # 获取案例文件列表
-    case_files = get_user_case_files(username)
+    case_files = get_case_files()
     total_cases = len(case_files)
 
     if total_cases == 0:
@@ -324,11 +624,17 @@ def get_previous_case_index(username):
 
 @app.route('/get-ai-response', methods=['POST'])
 def get_ai_response():
-    """获取AI对用户消息的响应"""
+    """获取AI对用户消息的响应
+
+    请求中 with_category 为 true 时，同时返回回复的分类（category），
+    一轮对话只需一次请求。
+    """
     data = request.json
     user_message = data.get('message', '')
     user_id = data.get('user_id', 'default_user')
     username = data.get('username', '')  # 添加username参数
+    # 同时返回回复的分类，省去单独的/classify-message请求
+    with_category = bool(data.get('with_category', False))
 
     # 如果没有提供username，尝试从user_id中提取
     if not username:
@@ -347,18 +653,56 @@ def get_ai_response():
     })
 
     try:
-        assistant_output = get_response(user_state['message_history'])
+        instant_reply, source = answer_without_llm(username, user_message)
+        if instant_reply:
+            user_state['message_history'].append({
+                "role": "assistant",
+                "content": instant_reply
+            })
+            schedule_history_summary(username)
+            notify_user(username, 'reply', source=source)
+            result = {
+                'status': 'success',
+                'reply': instant_reply,
+                'prompt_tokens': 0,
+                'source': source
+            }
+            if with_category:
+                result.update(categorize_reply(instant_reply, source=source))
+            return jsonify(result)
+
+        cache_key = get_answer_cache_key(username)
+
+        # 只发送系统提示、相关检查结果和预算内的最近几轮对话
+        prompt_messages, context_stats = build_prompt(username)
+        if with_category:
+            # 分类和回复在同一次LLM调用中生成
+            prompt_messages = with_category_instruction(prompt_messages)
+
+        assistant_output = get_response(prompt_messages)
+        reply_category = None
+        if with_category:
+            assistant_output, reply_category = split_reply_category(assistant_output)
+        if not is_llm_error_reply(assistant_output):
+            answer_cache.put(cache_key, assistant_output)
 
         # 添加到对话历史
         user_state['message_history'].append({
             "role": "assistant",
             "content": assistant_output
         })
+        schedule_history_summary(username)
+        notify_user(username, 'reply', source='llm')
 
-        return jsonify({
+        result = {
             'status': 'success',
-            'reply': assistant_output
-        })
+            'reply': assistant_output,
+            'prompt_tokens': context_stats['prompt_tokens'],
+            'source': 'llm'
+        }
+        if with_category:
+            result.update(categorize_reply(assistant_output, reply_category))
+        return jsonify(result)
 
     except Exception as e:
         import traceback
@@ -370,6 +714,180 @@ def get_ai_response():
         }), 500
 
 
+@app.route('/get-ai-response-stream', methods=['POST'])
+def get_ai_response_stream():
+    """以SSE流式返回AI对用户消息的响应
+
+    事件格式：
+    - data: {"delta": "..."}  逐段返回的回复内容
+    - event: done    data: {"reply": "...", "ttft_ms": ..., "total_ms": ..., "prompt_tokens": ..., "source": "llm"/"exam_results"/"cache"}
+      请求中 with_category 为 true 时，done 事件同时包含 category 和 category_source
+    - event: error   data: {"message": "..."}
+    """
+    data = request.json
+    user_message = data.get('message', '')
+    user_id = data.get('user_id', 'default_user')
+    username = data.get('username', '')
+    with_category = bool(data.get('with_category', False))
+
+    if not username:
+        username = user_id
+
+    user_state = get_user_state(username)
+
+    if not user_state['initialized']:
+        initialize_case(username)
+
+    # 添加用户消息到历史
+    user_turn = {
+        "role": "user",
+        "content": user_message
+    }
+    user_state['message_history'].append(user_turn)
+    instant_reply, source = answer_without_llm(username, user_message)
+    splitter = None
+    if instant_reply is None:
+        cache_key = get_answer_cache_key(username)
+        messages, context_stats = build_prompt(username)
+        if with_category:
+            # 分类和回复在同一次LLM调用中生成，分类标记不发送给前端
+            messages = with_category_instruction(messages)
+            splitter = ReplyCategorySplitter()
+    else:
+        context_stats = {'prompt_tokens': 0}
+
+    def generate():
+        start_time = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        reply_category = None
+        completed = False
+        try:
+            deltas = [instant_reply] if instant_reply else stream_response(messages)
+            for delta in deltas:
+                if splitter:
+                    delta = splitter.feed(delta)
+                    if not delta:
+                        continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start_time) * 1000
+                    print(f"[AI] 用户 {username} 首字延迟: {ttft_ms:.0f}ms")
+                parts.append(delta)
+                yield sse_event({'delta': delta})
+            if splitter:
+                rest, reply_category = splitter.finish()
+                if rest:
+                    parts.append(rest)
+                    yield sse_event({'delta': rest})
+
+            assistant_output = ''.join(parts).rstrip()
+            total_ms = (time.perf_counter() - start_time) * 1000
+
+            # 流结束后将完整回复添加到对话历史
+            user_state['message_history'].append({
+                "role": "assistant",
+                "content": assistant_output
+            })
+            if not instant_reply:
+                answer_cache.put(cache_key, assistant_output)
+            schedule_history_summary(username)
+            notify_user(username, 'reply', source=source)
+
+            result = {
+                'status': 'success',
+                'reply': assistant_output,
+                'ttft_ms': round(ttft_ms, 1) if ttft_ms is not None else None,
+                'total_ms': round(total_ms, 1),
+                'prompt_tokens': context_stats['prompt_tokens'],
+                'source': source
+            }
+            completed = True
+            if with_category:
+                result.update(categorize_reply(
+                    assistant_output, reply_category, source=source))
+            yield sse_event(result, event='done')
+
+        except Exception as e:
+            import traceback
+            error_info = f"处理流式请求时出错: {str(e)}"
+            print(f"Error: {error_info}\n{traceback.format_exc()}")
+            yield sse_event({
+                'status': 'error',
+                'message': error_info,
+                'partial_reply': ''.join(parts)
+            }, event='error')
+        finally:
+            if not completed:
+                # 出错或客户端断开：保留已发出的部分回复，没有任何回复时撤回用户消息，
+                # 避免下一轮出现两条连续的用户消息
+                close_interrupted_turn(user_state, user_turn, ''.join(parts))
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
+def close_interrupted_turn(user_state, user_turn, partial_reply):
+    """流式回复中断后整理对话历史，使用户消息和助手回复保持交替"""
+    history = user_state['message_history']
+    if not history or history[-1] is not user_turn:
+        return
+    if partial_reply:
+        history.append({
+            "role": "assistant",
+            "content": partial_reply
+        })
+    else:
+        history.pop()
+
+
+@app.route('/api/events', methods=['GET'])
+def user_event_stream():
+    """按用户推送状态变化（SSE），替代每秒轮询
+
+    事件格式：
+    - event: hello   连接（或重连）时发送一次，data: {"version", "case_index", "case_list_version"}
+    - event: case    当前案例变化（init-user/next-step/previous-step），data: {"version", "case_index", "case_file"}
+    - event: saved   对话保存完成，data: {"version", "case_index"}
+    - event: reply   AI回复已加入对话历史，data: {"version", "source"}
+    每隔 PUSH_HEARTBEAT_INTERVAL 秒发送一条注释行保持连接。
+    """
+    username = request.args.get('username', '')
+    if not username:
+        return jsonify({'status': 'error', 'message': '缺少用户名信息'}), 400
+
+    subscriber = user_events.subscribe(username)
+    user_state = get_user_state(username)
+
+    def generate():
+        try:
+            yield sse_event({
+                'version': user_events.version(username),
+                'case_index': user_state['current_case_index'],
+                'case_list_version': case_registry.version
+            }, event='hello')
+            while True:
+                try:
+                    version, event, data = subscriber.get(
+                        timeout=config.PUSH_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(dict(data, version=version), event=event)
+        finally:
+            user_events.unsubscribe(username, subscriber)
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
 @app.route('/api/next-step', methods=['POST'])
 def handle_next_step():
     """处理下一个病例的请求"""
@@ -389,7 +907,7 @@ def handle_next_step():
 
         # 获取下一个未完成的案例索引
         next_case_index = get_next_case_index(username)
-        case_files = get_user_case_files(username)
+        case_files = get_case_files()
         total_cases = len(case_files)
 
         # 先清空当前的消息历史，然后更新案例索引
@@ -478,7 +996,7 @@ def save_message_history(username):
     file_name = f"{username}.json"
 
     # 获取案例文件列表和当前案例索引
-    case_files = get_user_case_files(username)
+    case_files = get_case_files()
     save_case_index = user_state['current_case_index']
 
     if save_case_index < len(case_files):
@@ -503,13 +1021,20 @@ def save_message_history(username):
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(filtered_history, f, ensure_ascii=False, indent=2)
         print(f"已保存过滤后的对话历史到: {file_path}")
+        completion_index.mark_completed(username, case_folder)
+        bump_state_version(user_state)
+        notify_user(username, 'saved', case_index=save_case_index)
     except Exception as e:
         print(f"保存对话历史失败: {str(e)}")
 
 
 @app.route('/current-case', methods=['GET'])
 def get_current_case():
-    """获取当前加载的病例信息"""
+    """获取当前加载的病例信息
+
+    长轮询：传入上次响应中的 state_version 作为 since_version 时，请求会等待
+    用户状态变化（最多 timeout 秒，上限 LONG_POLL_MAX_TIMEOUT）后再返回。
+    """
     user_id = request.args.get('user_id', 'default_user')
     username = request.args.get('username', '')  # 添加username参数
 
@@ -519,9 +1044,21 @@ def get_current_case():
 
     user_state = get_user_state(username)
 
+    since_version = request.args.get('since_version', type=int)
+    if since_version is not None:
+        timeout = min(request.args.get('timeout', default=config.LONG_POLL_MAX_TIMEOUT, type=float),
+                      config.LONG_POLL_MAX_TIMEOUT)
+        user_events.wait_for(
+            lambda: user_state['state_version'] != since_version, max(timeout, 0))
+
+    # 状态未变化时直接返回304，不再重新构建formatted_data和调试信息
+    etag = state_etag(user_state, 'current-case')
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
     try:
-        # 获取该用户的案例文件列表
-        case_files = get_user_case_files(username)
+        # 获取共享的案例文件列表
+        case_files = get_case_files()
         case_filename = case_files[user_state['current_case_index']
                                    ] if case_files and user_state['current_case_index'] < len(case_files) else "未找到病例"
 
@@ -544,22 +1081,22 @@ def get_current_case():
                 value_display = str(value).replace("\\n", "\n")
                 formatted_data += f"{key_display}: {value_display}\n"
 
-        # 获取该用户的案例文件列表
-        case_files = get_user_case_files(username)
         total_cases = len(case_files)
 
         print(
             f"用户 {username} 当前病例索引: {user_state['current_case_index']}, 总案例数: {total_cases}")
-        return jsonify({
+        return with_etag(jsonify({
             'status': 'success',
             'case_index': user_state['current_case_index'],
+            'state_version': user_state['state_version'],
+            'case_list_version': case_registry.version,
             'formatted_data': formatted_data,
             'debug_info': {
                 'total_cases': total_cases,
                 'case_files': case_files,
                 'current_case_file': case_files[user_state['current_case_index']] if case_files and user_state['current_case_index'] < len(case_files) else 'N/A'
             }
-        })
+        }), etag)
 
     except Exception as e:
         return jsonify({
@@ -591,6 +1128,10 @@ def get_main_suit():
                     'message': f'Failed to load case data for user {username}'
                 }), 404
 
+        etag = state_etag(user_state, 'main-suit')
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
         # 检查是否有main_suit字段
         if 'main_suit' in user_state['case_data']:
             main_suit = user_state['case_data']['main_suit']
@@ -598,14 +1139,14 @@ def get_main_suit():
                 'status': 'success',
                 'main_suit': main_suit
             }
-            return jsonify(result)
+            return with_etag(jsonify(result), etag)
         else:
             # 如果没有main_suit字段，返回默认值而不是404错误
             print(f"警告：用户 {username} 的案例数据中没有main_suit字段")
-            return jsonify({
+            return with_etag(jsonify({
                 'status': 'success',
                 'main_suit': '有一些不舒服'
-            })
+            }), etag)
 
     except Exception as e:
         print(f"获取主诉失败: {str(e)}")
@@ -637,8 +1178,12 @@ def init_user():
         user_state['case_data'] = load_medical_case(username, next_case_index)
         initialize_case(username)
 
-        # 获取该用户的案例文件列表
-        case_files = get_user_case_files(username)
+        # 预热到LLM服务的连接，避免首轮对话承担TCP/TLS握手
+        llm_session.prewarm(config.OPENAI_BASE_URL, config.OPENAI_API_KEY,
+                            connections=config.LLM_PREWARM_CONNECTIONS)
+
+        # 获取共享的案例文件列表
+        case_files = get_case_files()
 
         return jsonify({
             'status': 'success',
@@ -647,6 +1192,7 @@ def init_user():
             'username': username,
             'next_case_index': next_case_index,
             'total_cases': len(case_files),
+            'case_list_version': case_registry.version,
             'debug_info': {
                 'case_files': case_files,
                 'current_case_file': case_files[next_case_index] if next_case_index < len(case_files) else 'N/A',
@@ -672,7 +1218,7 @@ def get_saved_conversation():
             }), 400
 
         # 获取案例文件列表
-        case_files = get_user_case_files(username)
+        case_files = get_case_files()
         if case_index >= len(case_files):
             return jsonify({
                 'status': 'error',
@@ -683,6 +1229,12 @@ def get_saved_conversation():
         case_file_path = case_files[case_index]
         case_folder = case_file_path.split('/')[0]
 
+        # 保存对话会递增状态版本，已保存的对话未变化时直接返回304
+        user_state = get_user_state(username)
+        etag = state_etag(user_state, 'saved-conversation', case_index)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
         # 构建case文件夹路径
         conversations_dir = config.CONVERSATIONS_DIR
         case_dir = os.path.join(conversations_dir, case_folder)
@@ -707,13 +1259,13 @@ def get_saved_conversation():
         with open(user_file_path, 'r', encoding='utf-8') as f:
             saved_data = json.load(f)
 
-        return jsonify({
+        return with_etag(jsonify({
             'status': 'success',
             'conversation': saved_data.get('conversation', []),
             'Diagnosis': saved_data.get('Diagnosis', ''),
             'Treatment': saved_data.get('Treatment', ''),
             'file': expected_filename
-        })
+        }), etag)
 
     except Exception as e:
         print(f"获取已保存对话失败: {str(e)}")
@@ -778,8 +1330,8 @@ def save_conversation():
         # 3. 返回该案例时数据为空
         # 新逻辑：只要用户提交了数据，就保存以标记该案例已完成
 
-        # 获取该用户的案例文件列表
-        case_files = get_user_case_files(username)
+        # 获取共享的案例文件列表
+        case_files = get_case_files()
 
         # 确定要保存的案例索引
         if target_case_index is not None:
@@ -844,6 +1396,9 @@ def save_conversation():
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(save_data, f, ensure_ascii=False, indent=2)
             debug_info['file_saved'] = True
+            completion_index.mark_completed(username, case_folder)
+            bump_state_version(user_state)
+            notify_user(username, 'saved', case_index=save_case_index)
             debug_info['file_size'] = len(
                 json.dumps(save_data, ensure_ascii=False))
         except Exception as file_error:
@@ -868,6 +1423,111 @@ def save_conversation():
         }), 500
 
 
+CLASSIFICATION_PROMPT = """
+请对以下医疗对话内容进行分类，只返回分类结果（不要其他解释）：
+
+分类类别：
+- symptom: 症状（患者的主观感受，如疼痛、不适、发烧、胸闷、胸痛、心悸、气短、呼吸困难、晕厥等）
+- sign: 体征（医生检查发现的客观表现，如体温、血压、心率、心脏听诊、瓣膜杂音、心界、肺部听诊等）
+- examination: 辅助检查（实验室检查、影像学检查等，如血常规、心电图、超声心动图、心肌标志物、甲状腺功能、理化指标等）
+- history: 个人史（病史、家族史、生活习惯、手术史、用药史、家族遗传史等）
+- other: 其他（不属于上述类别的内容）
+
+对话内容：{message}
+
+请只返回分类结果（symptom/sign/examination/history/other）：
+"""
+
+
+def classify_with_llm(message):
+    """使用LLM对消息分类，返回 (分类, 是否为LLM给出的有效分类)"""
+    try:
+        # 使用现有的AI模型进行分类
+        classification_messages = [
+            {"role": "user", "content": CLASSIFICATION_PROMPT.format(message=message)}
+        ]
+
+        # 调用AI进行分类
+        classification_response = get_response(classification_messages)
+        category = classification_response.strip().lower()
+
+        # 验证分类结果
+        if category not in CATEGORIES:
+            print(f"LLM返回无效分类结果: '{category}'，使用默认分类: 'other'")
+            return 'other', False
+
+        print(f"LLM分类成功: {category}")
+        return category, True
+
+    except Exception as llm_error:
+        print(f"LLM分类失败: {str(llm_error)}，使用默认分类: 'other'")
+        return 'other', False
+
+
+def classify_text(message):
+    """对消息分类：先查缓存，再用本地分类器，置信度不足时回退到LLM
+
+    返回 (分类, 来源 'cache'/'local'/'llm', 本地置信度)
+    """
+    cache_key = content_hash(message)
+    cached = classification_cache.get(cache_key)
+    if cached:
+        return cached, 'cache', None
+
+    confidence = None
+    if config.CLASSIFIER_LOCAL_ENABLED:
+        category, confidence = message_classifier.classify(message)
+        if message_classifier.is_confident(confidence):
+            message_classifier.record(local=True)
+            classification_cache.put(cache_key, category)
+            return category, 'local', confidence
+
+    category, valid = classify_with_llm(message)
+    if valid:
+        classification_cache.put(cache_key, category)
+    if config.CLASSIFIER_LOCAL_ENABLED:
+        message_classifier.record(local=False)
+        if valid:
+            # LLM给出的分类作为本地分类器的训练标签
+            message_classifier.learn(message, category)
+    return category, 'llm', confidence
+
+
+# with_category 时附加在prompt末尾，让模型在同一次回复中给出分类
+REPLY_CATEGORY_INSTRUCTION = (
+    "After your reply, add one final line with the category of your reply, "
+    "exactly in the form [category: X], where X is one of: symptom (the "
+    "patient's subjective complaints), sign (objective findings of a physical "
+    "examination), examination (laboratory or imaging results), history "
+    "(past, family, personal or medication history), other. The doctor "
+    "does not see this line."
+)
+
+
+def with_category_instruction(messages):
+    """在发送给LLM的消息末尾加上分类要求"""
+    return messages + [{"role": "system", "content": REPLY_CATEGORY_INSTRUCTION}]
+
+
+def categorize_reply(reply, category=None, source=None):
+    """为AI回复分类，结果附加到对话接口的响应中
+
+    ``category`` 为同一次回复中模型给出的分类；没有时才单独分类。
+    检查结果直接作答的回复固定为 examination。
+    """
+    if is_llm_error_reply(reply):
+        return {'category': None, 'category_source': None}
+    if source == 'exam_results':
+        return {'category': 'examination', 'category_source': 'exam_results'}
+    if category:
+        classification_cache.put(content_hash(reply), category)
+        if config.CLASSIFIER_LOCAL_ENABLED:
+            message_classifier.learn(reply, category)
+        return {'category': category, 'category_source': 'completion'}
+    category, source, _ = classify_text(reply)
+    return {'category': category, 'category_source': source}
+
+
 @app.route('/classify-message', methods=['POST'])
 def classify_message():
     """对AI回复进行分类的API端点"""
@@ -883,64 +1543,107 @@ def classify_message():
                 'message': '消息内容不能为空'
             }), 400
 
-        # 使用LLM进行分类
-        classification_prompt = f"""
-请对以下医疗对话内容进行分类，只返回分类结果（不要其他解释）：
+        category, source, confidence = classify_text(message)
 
-分类类别：
-- symptom: 症状（患者的主观感受，如疼痛、不适、发烧、胸闷、胸痛、心悸、气短、呼吸困难、晕厥等）
-- sign: 体征（医生检查发现的客观表现，如体温、血压、心率、心脏听诊、瓣膜杂音、心界、肺部听诊等）
-- examination: 辅助检查（实验室检查、影像学检查等，如血常规、心电图、超声心动图、心肌标志物、甲状腺功能、理化指标等）
-- history: 个人史（病史、家族史、生活习惯、手术史、用药史、家族遗传史等）
-- other: 其他（不属于上述类别的内容）
+        return jsonify({
+            'status': 'success',
+            'category': category,
+            'source': source,
+            'confidence': round(confidence, 3) if confidence is not None else None,
+            'message': f'Message classified as: {category}'
+        })
 
-对话内容：{message}
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Classification failed: {str(e)}'
+        }), 500
 
-请只返回分类结果（symptom/sign/examination/history/other）：
-"""
 
-        try:
-            # 使用现有的AI模型进行分类
-            classification_messages = [
-                {"role": "user", "content": classification_prompt}
-            ]
+@app.route('/classify-messages', methods=['POST'])
+def classify_messages():
+    """批量分类：去重后并发分类，重复内容直接使用缓存结果
+
+    请求: {"messages": ["...", ...]}，元素也可以是带content字段的消息对象
+    返回: categories 和 sources 与请求中的messages一一对应
+    """
+    try:
+        data = request.get_json()
+        messages = data.get('messages', [])
+
+        if not isinstance(messages, list) or not messages:
+            return jsonify({
+                'status': 'error',
+                'message': '消息列表不能为空'
+            }), 400
 
-            # 调用AI进行分类
-            classification_response = get_response(classification_messages)
-            category = classification_response.strip().lower()
+        texts = [m.get('content', '') if isinstance(m, dict) else str(m or '')
+                 for m in messages]
+        unique_texts = [t for t in dict.fromkeys(texts) if t]
 
-            # 验证分类结果
-            valid_categories = ['symptom', 'sign',
-                                'examination', 'history', 'other']
-            if category not in valid_categories:
-                print(f"LLM返回无效分类结果: '{category}'，使用默认分类: 'other'")
-                category = 'other'
-            else:
-                print(f"LLM分类成功: {category}")
+        results = {}
+        if unique_texts:
+            workers = min(len(unique_texts), config.LLM_MAX_IN_FLIGHT)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for text, (category, source, _) in zip(
+                        unique_texts, executor.map(classify_text, unique_texts)):
+                    results[text] = (category, source)
 
-        except Exception as llm_error:
-            print(f"LLM分类失败: {str(llm_error)}，使用默认分类: 'other'")
-            category = 'other'
+        categories = [results[t][0] if t in results else 'other' for t in texts]
+        sources = [results[t][1] if t in results else None for t in texts]
 
         return jsonify({
             'status': 'success',
-            'category': category,
-            'message': f'Message classified as: {category}'
+            'categories': categories,
+            'sources': sources,
+            'total': len(texts),
+            'unique': len(unique_texts),
+            'llm_calls': sum(1 for c, s in results.values() if s == 'llm')
         })
 
     except Exception as e:
         return jsonify({
             'status': 'error',
-            'message': f'Classification failed: {str(e)}'
+            'message': f'Batch classification failed: {str(e)}'
         }), 500
 
 
+@app.route('/llm-metrics', methods=['GET'])
+def get_llm_metrics():
+    """LLM网关的队列深度、并发数、延迟统计、连接复用，以及检查结果索引、直答、回答缓存和本地分类器的命中情况"""
+    return jsonify({
+        'status': 'success',
+        'gateway': llm_gateway.metrics(),
+        'connections': llm_session.metrics(),
+        'exam_index': exam_index_stats.snapshot(),
+        'exam_fast_path': exam_fast_path.snapshot(),
+        'answer_cache': answer_cache.snapshot(),
+        'classifier': message_classifier.snapshot(),
+        'classification_cache': classification_cache.snapshot()
+    })
+
+
+@app.route('/api/completion-index/rebuild', methods=['POST'])
+def rebuild_completion_index():
+    """重新扫描案例目录并重建完成索引（例如手动删除或拷入了用户文件后）"""
+    case_registry.refresh()
+    completion_index.rebuild(case_registry.snapshot)
+    return jsonify({
+        'status': 'success',
+        'case_list_version': case_registry.version,
+        'completion_index': completion_index.snapshot()
+    })
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Analysis service"""
     return jsonify({
         'status': 'healthy',
-        'service': 'analysis'
+        'service': 'analysis',
+        'total_cases': len(case_registry.snapshot),
+        'case_list_version': case_registry.version,
+        'sessions': user_states.snapshot()
     }), 200
 
 
@@ -1,7 +1,10 @@
 import logging
 from evaluation_config import get_evaluation_config
+from case_store import (CaseRegistry, CaseWatcher, load_case, load_dimensions,
+                        load_transcript, open_bundle)
+from evaluator_store import ScoreCommitter, VersionConflict, create_evaluator_store
+from session_store import SessionStore
 import uuid
-import threading
 from datetime import datetime
 import json
 from flask_cors import CORS
@@ -69,8 +72,12 @@ print(f"[Startup]   OPENAI_BASE_URL: {openai_base_url or '❌ NOT SET'}")
 print(
     f"[Startup]   OPENAI_API_KEY: {'✓ SET' if openai_api_key else '❌ NOT SET'}")
 print(f"[Startup]   CONVERSATIONS_DIR: {config.CONVERSATIONS_DIR}")
+print(f"[Startup]   CASE_BUNDLE_PATH: {config.CASE_BUNDLE_PATH}")
 print(f"[Startup] ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
 
+# 加载预编译的病例数据包（不存在时回退到conversations目录结构）
+open_bundle(config.CASE_BUNDLE_PATH)
+
 # 验证必要的配置是否存在
 config_errors = []
 if not openai_model:
@@ -95,56 +102,154 @@ config.init_app(app)
 
 CORS(app, origins=config.CORS_ORIGINS)
 
-# 用户状态管理 - 使用字典存储每个用户的状态，以username为键
-user_states = {}
-user_states_lock = threading.Lock()
-
 # 全局变量，将在运行时初始化
 cases_dir = None
 case_files = []
 
+# 病例索引：目录变化时由后台监听线程整体替换case_files，无需重启服务
+case_registry = CaseRegistry(config.CONVERSATIONS_DIR, config.CASE_BUNDLE_PATH)
+case_watcher = None
+
+# 评估者文档存储：默认为JSON文件+追加日志（读取时合并，后台定期压缩），可切换为SQLite；
+# 前面有一层写穿透的文档缓存，读取时不再解析文件
+evaluator_store = create_evaluator_store(
+    config.EVALUATION_STORAGE, config.EVALUATORS_DIR, config.EVALUATION_DB_PATH,
+    compact_bytes=config.EVALUATOR_JOURNAL_COMPACT_BYTES,
+    fsync=config.EVALUATOR_JOURNAL_FSYNC,
+    cache_entries=config.EVALUATOR_CACHE_MAX_ENTRIES)
+
+# 单条评分保存的合并写入（快速连续点击只落盘一次，落盘后才返回）
+score_committer = None
+if config.EVALUATOR_SAVE_COALESCE_MS > 0:
+    score_committer = ScoreCommitter(
+        evaluator_store, window=config.EVALUATOR_SAVE_COALESCE_MS / 1000)
+
 # 简化版本：不再使用case_group和assigned_cases
 
 
+def new_user_state():
+    return {
+        'current_case_index': 0,
+        'user_dir': None,
+        'case_data': None,
+        'initialized': False,
+        'user_id': None
+    }
+
+
 def get_user_state(username):
-    """获取或创建用户状态，使用username作为键"""
-    with user_states_lock:
-        if username not in user_states:
-            user_states[username] = {
-                'current_case_index': 0,
-                'user_dir': None,
-                'case_data': None,
-                'initialized': False,
-                'user_id': None
-            }
-            print(f"为用户 {username} 创建新状态")
-        else:
-            print(
-                f"获取用户 {username} 现有状态，当前case_index: {user_states[username]['current_case_index']}")
-        return user_states[username]
+    """获取或创建用户状态，使用username作为键
+
+    已写入磁盘的用户状态会被透明地恢复。
+    """
+    existing = username in user_states
+    user_state = user_states.get_or_create(username)
+    if existing:
+        print(
+            f"获取用户 {username} 现有状态，当前case_index: {user_state['current_case_index']}")
+    else:
+        print(f"为用户 {username} 创建（或恢复）状态")
+    return user_state
+
+
+def dehydrate_user_state(user_state):
+    """写入磁盘的用户状态：不保存病例数据，只记录案例文件夹以便恢复时重新定位"""
+    saved = {key: value for key, value in user_state.items()
+             if key != 'case_data'}
+    saved['case_folder'] = case_registry.snapshot.folder_at(
+        user_state['current_case_index'])
+    return saved
+
+
+def rehydrate_user_state(username, saved):
+    """从磁盘快照恢复用户状态，并重新加载病例数据"""
+    user_state = new_user_state()
+    case_folder = saved.pop('case_folder', None)
+    user_state.update(saved)
+    if case_folder is not None:
+        case_index = case_registry.snapshot.index_of(case_folder)
+        if case_index is not None:
+            user_state['current_case_index'] = case_index
+    if user_state['initialized']:
+        user_state['case_data'] = load_evaluation_case(
+            user_state['current_case_index'], username)
+    print(f"[Sessions] 恢复用户 {username} 的会话，当前case_index: "
+          f"{user_state['current_case_index']}")
+    return user_state
+
+
+def user_state_size(user_state):
+    """估算用户状态占用的内存（病例数据为共享缓存，不计入）"""
+    return sum(len(str(value)) for key, value in user_state.items()
+               if key != 'case_data')
+
+
+# 用户状态管理 - 以username为键，超出上限或长时间空闲的状态写入磁盘，下次请求时恢复
+user_states = SessionStore(
+    'evaluation', new_user_state, dehydrate_user_state, rehydrate_user_state,
+    sizeof=user_state_size,
+    max_entries=config.SESSION_MAX_ENTRIES,
+    max_bytes=config.SESSION_MAX_BYTES,
+    idle_ttl=config.SESSION_IDLE_TTL,
+    min_idle=config.SESSION_MIN_IDLE,
+    spill_dir=config.SESSION_SPILL_DIR)
 
 
 def initialize_case_files():
-    """初始化案例文件列表（从conversations目录）"""
-    global cases_dir, case_files
+    """初始化案例文件列表（从病例数据包和conversations目录），并启动目录监听"""
+    global cases_dir, case_watcher
     cases_dir = config.CONVERSATIONS_DIR
-    if os.path.exists(cases_dir):
-        # 直接从conversations目录获取案例文件夹列表
-        all_case_dirs = [d for d in os.listdir(cases_dir)
-                         if os.path.isdir(os.path.join(cases_dir, d)) and d.startswith('case')]
-        case_files = sorted(all_case_dirs, key=lambda x: int(
-            x.replace('case', ''))) if all_case_dirs else []
+    case_registry.refresh()
+    if case_files:
         print(f"评估系统初始化 - 案例目录: {cases_dir}")
-        print(f"从conversations目录获取案例文件夹: {case_files}")
+        print(f"获取案例文件夹: {case_files}")
     else:
-        print(f"警告：conversations目录不存在: {cases_dir}")
-        case_files = []
+        print(f"警告：未找到任何案例（数据包或conversations目录）: {cases_dir}")
+
+    if config.CASE_WATCH_ENABLED and case_watcher is None:
+        case_watcher = CaseWatcher(
+            case_registry, config.CASE_WATCH_INTERVAL).start()
+
+
+def on_cases_changed(old_snapshot, new_snapshot, changed_folders):
+    """病例目录变化后替换案例列表，并让在线用户停留在原来的案例上"""
+    global case_files
+    case_files = list(new_snapshot.folders)
+
+    for username, user_state in user_states.items():
+        folder = old_snapshot.folder_at(user_state['current_case_index'])
+        if folder is None:
+            continue
+        new_index = new_snapshot.index_of(folder)
+        if new_index is None:
+            # 当前案例被删除，停在原索引位置（可能指向相邻案例）
+            new_index = min(user_state['current_case_index'],
+                            max(len(new_snapshot) - 1, 0))
+        if new_index != user_state['current_case_index']:
+            print(f"用户 {username} 的案例 {folder} 索引变化: "
+                  f"{user_state['current_case_index']} -> {new_index}")
+            user_state['current_case_index'] = new_index
+        if folder in changed_folders or new_snapshot.folder_at(new_index) != folder:
+            user_state['case_data'] = load_evaluation_case(new_index, username)
+
+
+case_registry.add_listener(on_cases_changed)
+
+
+def current_case_snapshot():
+    """当前的病例索引；未启用目录监听时每次请求重新检查目录，以发现新增的对话文件"""
+    if case_watcher is None:
+        case_registry.refresh()
+    return case_registry.snapshot
 
 
-def load_evaluation_case(case_index, username):
-    """加载指定索引的评估案例文件（从conversations目录）"""
+def load_evaluation_case(case_index, username, revalidate=False):
+    """加载指定索引的评估案例文件（从conversations目录）
+
+    通过进程内共享的病例缓存读取，所有用户状态引用同一份只读数据。
+    """
     # 确保案例文件已初始化
-    if not case_files:
+    if not case_registry.version:
         initialize_case_files()
 
     # 直接使用全局案例文件列表
@@ -152,17 +257,7 @@ def load_evaluation_case(case_index, username):
         print(f"案例索引 {case_index} 超出范围，总案例数: {len(case_files)}")
         return None
 
-    case_folder = os.path.join(cases_dir, case_files[case_index])
-    case_file = os.path.join(case_folder, f"{case_files[case_index]}.json")
-
-    print(f"尝试加载案例文件: {case_file}")
-
-    try:
-        with open(case_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
-    except Exception:
-        return None
+    return load_case(cases_dir, case_files[case_index], revalidate=revalidate)
 
 
 def get_next_case_index(username):
@@ -191,6 +286,17 @@ def get_user_dir(username):
     return base_dir
 
 
+def version_conflict_response(error):
+    """并发修改冲突：客户端应重新读取数据后再保存"""
+    print(f"评估数据保存冲突: {str(error)}")
+    return jsonify({
+        'status': 'conflict',
+        'error': '数据已在其他页面被修改，请刷新后重试',
+        'conflicts': error.fields,
+        'version': error.version
+    }), 409
+
+
 def initialize_case(username):
     """初始化当前案例"""
     user_state = get_user_state(username)
@@ -219,40 +325,32 @@ def create_evaluation_user():
         evaluators_dir = config.EVALUATORS_DIR
         os.makedirs(evaluators_dir, exist_ok=True)
 
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        # 检查用户JSON文件是否已存在
-        if os.path.exists(user_file):
-            # 如果文件已存在，读取现有数据并更新用户信息
-            with open(user_file, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-
-            # 更新用户信息，保留其他字段
-            existing_data.update({
-                'username': username,
-                'updated_at': datetime.now().isoformat()
-            })
+        # 检查与创建在同一把用户锁内完成，避免并发请求重复创建
+        with evaluator_store.lock_for(username):
+            # 检查用户JSON文件是否已存在
+            if evaluator_store.exists(username):
+                # 如果文件已存在，更新用户信息，保留其他字段
+                evaluator_store.append(username, 'update', fields={
+                    'username': username,
+                    'updated_at': datetime.now().isoformat()
+                })
 
-            with open(user_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
+                return jsonify({
+                    'message': '用户文件已存在，信息已更新',
+                    'username': username,
+                    'user_file': f'{evaluators_dir}/{username}.json'
+                })
 
-            return jsonify({
-                'message': '用户文件已存在，信息已更新',
+            # 如果不存在，则创建用户JSON文件
+            user_data = {
                 'username': username,
-                'user_file': f'{evaluators_dir}/{username}.json'
-            })
-
-        # 如果不存在，则创建用户JSON文件
-        user_data = {
-            'username': username,
-            'created_at': datetime.now().isoformat(),
-            'evaluations': [],
-            'current_case_index': 0,
-            'total_cases_completed': 0
-        }
+                'created_at': datetime.now().isoformat(),
+                'evaluations': [],
+                'current_case_index': 0,
+                'total_cases_completed': 0
+            }
 
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+            evaluator_store.create(username, user_data)
 
         return jsonify({
             'message': '用户文件创建成功',
@@ -522,7 +620,7 @@ def get_evaluation_answer():
     # 如果强制刷新，重新加载当前案例数据
     if force_refresh and user_state.get('current_case_index') is not None:
         new_case_data = load_evaluation_case(
-            user_state['current_case_index'], username)
+            user_state['current_case_index'], username, revalidate=True)
         if new_case_data:
             user_state['case_data'] = new_case_data
 
@@ -572,35 +670,14 @@ def submit_evaluation():
         if not username:
             return jsonify({'error': '缺少用户名信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
+        # 记录评估结果，保留原有信息（包括feedback）
+        evaluator_store.append(
+            username, 'submit', evaluation_results=evaluation_results)
 
-        # 更新用户信息，保留原有信息并添加评估结果
-        user_data.update({
-            'username': username,
-            'evaluation_results': evaluation_results,
-            'submitted_at': datetime.now().isoformat()
-        })
-
-        # 确保feedback信息被保留，不被覆盖
-        if 'feedback' not in user_data:
-            user_data['feedback'] = {}
-
-        print(f"准备保存用户数据: {user_data}")
-
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
-
-        print(f"用户数据保存成功: {user_file}")
+        print(f"用户 {username} 的评估结果提交成功")
 
         return jsonify({
             'status': 'success',
@@ -630,43 +707,28 @@ def save_feedback():
         if not username or not case_id or not evaluator_id:
             return jsonify({'error': '缺少必要参数'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
-        # 初始化feedback结构
-        if 'feedback' not in user_data:
-            user_data['feedback'] = {}
-
-        case_key = f'case{case_id}'
-        if case_key not in user_data['feedback']:
-            user_data['feedback'][case_key] = {}
-
         # 保存反馈
-        user_data['feedback'][case_key][evaluator_id] = feedback
-        user_data['updated_at'] = datetime.now().isoformat()
-
-        print(f"准备保存反馈数据: {user_data['feedback']}")
-
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        case_key = f'case{case_id}'
+        try:
+            evaluator_store.append(username, 'feedback', case_id=case_key,
+                                   evaluator_id=evaluator_id, feedback=feedback,
+                                   base_version=data.get('base_version'),
+                                   writer=data.get('client_id'))
+        except VersionConflict as e:
+            return version_conflict_response(e)
 
-        print(f"反馈数据保存成功: {user_file}")
+        print(f"用户 {username} 的反馈已保存: {case_key} - {evaluator_id}")
 
         return jsonify({
             'status': 'success',
             'message': '反馈保存成功',
             'username': username,
             'case_id': case_id,
-            'evaluator_id': evaluator_id
+            'evaluator_id': evaluator_id,
+            'version': evaluator_store.version(username)
         })
 
     except Exception as e:
@@ -680,20 +742,32 @@ def save_feedback():
 def get_user_evaluation_results(username):
     """获取用户的评估结果"""
     try:
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        # 读取用户文档（先取版本号，读取期间的修改会在下次保存时被检测到）
+        version = evaluator_store.version(username)
+        user_data = evaluator_store.load(username)
+        if user_data is None:
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
         return jsonify({
             'status': 'success',
             'username': username,
-            'user_data': user_data
+            'user_data': user_data,
+            'version': version
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/evaluation/results/<case_id>', methods=['GET'])
+def get_case_results(case_id):
+    """获取所有评估者对指定case（如case8）的评分、排序和反馈"""
+    try:
+        results = evaluator_store.case_results(case_id)
+        return jsonify({
+            'status': 'success',
+            'case_id': case_id,
+            'results': results,
+            'total': len(results)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -706,8 +780,13 @@ def evaluation_health_check():
         'status': 'healthy',
         'service': 'evaluation',
         'active_users': len(user_states),
+        'sessions': user_states.snapshot(),
+        'evaluator_store': evaluator_store.snapshot(),
+        'score_committer': score_committer.snapshot() if score_committer else None,
         'total_cases': len(case_files),
         'case_files': case_files,
+        'case_index_version': case_registry.version,
+        'case_watch_mode': case_watcher.mode if case_watcher else None,
         'cases_dir': cases_dir,
         'conversations_dir': config.CONVERSATIONS_DIR
     })
@@ -717,20 +796,16 @@ def evaluation_health_check():
 def get_evaluator_data(case_id, evaluator_id):
     """获取指定案例和评估者的对话和诊断信息"""
     try:
-        # 构建评估者文件路径
-        evaluator_file = os.path.join(
-            cases_dir, f'case{case_id}', f'{evaluator_id}.json')
+        # 从病例数据包或评估者文件读取
+        evaluator_data = load_transcript(
+            cases_dir, f'case{case_id}', evaluator_id)
 
-        if not os.path.exists(evaluator_file):
+        if evaluator_data is None:
             return jsonify({
                 'status': 'error',
-                'message': f'评估者文件不存在: {evaluator_file}'
+                'message': f'评估者文件不存在: case{case_id}/{evaluator_id}.json'
             }), 404
 
-        # 读取评估者文件
-        with open(evaluator_file, 'r', encoding='utf-8') as f:
-            evaluator_data = json.load(f)
-
         # 提取对话和诊断信息
         conversation = evaluator_data.get('conversation', [])
         diagnosis = evaluator_data.get('Diagnosis', '')
@@ -760,10 +835,9 @@ def get_evaluation_dimensions():
         dimensions_file = os.path.join(os.path.dirname(
             __file__), 'conversations', 'evaluation_dimensions.json')
 
-        if os.path.exists(dimensions_file):
-            with open(dimensions_file, 'r', encoding='utf-8') as f:
-                dimensions = json.load(f)
-            print(f"成功加载评估维度文件: {dimensions_file}")
+        # 优先从病例数据包读取
+        dimensions = load_dimensions(dimensions_file)
+        if dimensions is not None:
             print(f"维度数量: {len(dimensions)}")
             return jsonify(dimensions)
         else:
@@ -869,47 +943,90 @@ def save_dimension_score():
         if not all([username, case_id, evaluator_id, dimension_key, score is not None]):
             return jsonify({'error': '缺少必要参数'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
+        # 保存评分（只记录这一项改动，不重写整个用户文档）
+        # 带base_version时，其他页面在此之后修改过同一维度则返回409，修改其他维度则合并
+        try:
+            if score_committer:
+                score_committer.submit(username, case_id, evaluator_id, dimension_key, score,
+                                       base_version=data.get('base_version'),
+                                       writer=data.get('client_id'))
+            else:
+                evaluator_store.append(username, 'dimension_score', case_id=case_id,
+                                       evaluator_id=evaluator_id,
+                                       dimension_key=dimension_key, score=score,
+                                       base_version=data.get('base_version'),
+                                       writer=data.get('client_id'))
+        except VersionConflict as e:
+            return version_conflict_response(e)
 
-        # 初始化数据结构
-        if 'evaluation_results' not in user_data:
-            user_data['evaluation_results'] = {}
+        print(
+            f"用户 {username} 的评分已保存: {case_id} - {evaluator_id} - {dimension_key} = {score}")
 
-        if case_id not in user_data['evaluation_results']:
-            user_data['evaluation_results'][case_id] = {}
+        return jsonify({
+            'status': 'success',
+            'message': '评分保存成功',
+            'version': evaluator_store.version(username)
+        })
 
-        if evaluator_id not in user_data['evaluation_results'][case_id]:
-            user_data['evaluation_results'][case_id][evaluator_id] = {
-                'dimensions': {}}
+    except Exception as e:
+        import traceback
+        print(f"保存评分时出错: {str(e)}")
+        print(f"错误详情: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
 
-        # 保存评分
-        user_data['evaluation_results'][case_id][evaluator_id]['dimensions'][dimension_key] = score
-        user_data['updated_at'] = datetime.now().isoformat()
 
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+@app.route('/api/evaluation/save-dimension-scores', methods=['POST'])
+def save_dimension_scores():
+    """批量保存多个维度的评分，一次写入；任一项冲突时整批不保存"""
+    try:
+        data = request.get_json()
+        username = data.get('username')
+        scores = data.get('scores')
 
-        print(
-            f"用户 {username} 的评分已保存: {case_id} - {evaluator_id} - {dimension_key} = {score}")
+        if not username or not isinstance(scores, list) or not scores:
+            return jsonify({'error': '缺少必要参数'}), 400
+
+        items = []
+        for entry in scores:
+            if not isinstance(entry, dict):
+                return jsonify({'error': '评分格式不正确'}), 400
+            case_id = entry.get('case_id')
+            evaluator_id = entry.get('evaluator_id')
+            dimension_key = entry.get('dimension_key')
+            score = entry.get('score')
+            if not all([case_id, evaluator_id, dimension_key, score is not None]):
+                return jsonify({'error': '缺少必要参数'}), 400
+            items.append({
+                'case_id': case_id,
+                'evaluator_id': evaluator_id,
+                'dimension_key': dimension_key,
+                'score': score,
+                'base_version': data.get('base_version'),
+                'writer': data.get('client_id')
+            })
+
+        if not evaluator_store.exists(username):
+            return jsonify({'error': '用户不存在'}), 404
+
+        results = evaluator_store.append_scores(username, items, atomic=True)
+        if results[0] is not None:
+            return version_conflict_response(results[0])
+
+        print(f"用户 {username} 批量保存了 {len(items)} 条评分")
 
         return jsonify({
             'status': 'success',
-            'message': '评分保存成功'
+            'message': '评分保存成功',
+            'saved': len(items),
+            'version': evaluator_store.version(username)
         })
 
     except Exception as e:
         import traceback
-        print(f"保存评分时出错: {str(e)}")
+        print(f"批量保存评分时出错: {str(e)}")
         print(f"错误详情: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
@@ -924,17 +1041,12 @@ def get_user_scores():
         if not username:
             return jsonify({'error': '缺少用户名信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        # 读取用户文档（先取版本号，读取期间的修改会在下次保存时被检测到）
+        version = evaluator_store.version(username)
+        user_data = evaluator_store.load(username)
+        if user_data is None:
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
         # 获取评分数据
         evaluation_results = user_data.get('evaluation_results', {})
 
@@ -945,13 +1057,15 @@ def get_user_scores():
             case_scores = evaluation_results.get(case_id, {})
             return jsonify({
                 'status': 'success',
-                'scores': case_scores
+                'scores': case_scores,
+                'version': version
             })
         else:
             # 返回所有case的评分
             return jsonify({
                 'status': 'success',
-                'scores': evaluation_results
+                'scores': evaluation_results,
+                'version': version
             })
 
     except Exception as e:
@@ -972,37 +1086,11 @@ def initialize_case_fields():
         if not username or not case_id:
             return jsonify({'error': '缺少用户名或case_id信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
-        # 初始化数据结构
-        if 'evaluation_results' not in user_data:
-            user_data['evaluation_results'] = {}
-
-        if case_id not in user_data['evaluation_results']:
-            user_data['evaluation_results'][case_id] = {}
-
-            # 初始化feedback字段
-        if 'feedback' not in user_data:
-            user_data['feedback'] = {}
-
-        if case_id not in user_data['feedback']:
-            user_data['feedback'][case_id] = {}
-
-        # 更新updated_at时间戳
-        user_data['updated_at'] = datetime.now().isoformat()
-
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        # 初始化evaluation_results和feedback字段
+        evaluator_store.append(username, 'initialize_case', case_id=case_id)
 
         print(f"用户 {username} 的case {case_id} 字段初始化成功")
 
@@ -1031,41 +1119,25 @@ def save_ranking():
         if not username or not case_id:
             return jsonify({'error': '缺少用户名或case_id信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
-        # 初始化数据结构
-        if 'evaluation_results' not in user_data:
-            user_data['evaluation_results'] = {}
-
-        if case_id not in user_data['evaluation_results']:
-            user_data['evaluation_results'][case_id] = {}
-
         # 保存排序和档位数据
-        user_data['evaluation_results'][case_id].update({
-            'ranking': ranking,
-            'tiers': tiers,
-            'saved_at': datetime.now().isoformat()
-        })
-
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        try:
+            evaluator_store.append(username, 'ranking', case_id=case_id,
+                                   ranking=ranking, tiers=tiers,
+                                   base_version=data.get('base_version'),
+                                   writer=data.get('client_id'))
+        except VersionConflict as e:
+            return version_conflict_response(e)
 
         print(
             f"用户 {username} 的排序数据已保存: {case_id} - ranking: {ranking}, tiers: {tiers}")
 
         return jsonify({
             'status': 'success',
-            'message': '排序数据保存成功'
+            'message': '排序数据保存成功',
+            'version': evaluator_store.version(username)
         })
 
     except Exception as e:
@@ -1085,17 +1157,12 @@ def get_ranking():
         if not username:
             return jsonify({'error': '缺少用户名信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        # 读取用户文档（先取版本号，读取期间的修改会在下次保存时被检测到）
+        version = evaluator_store.version(username)
+        user_data = evaluator_store.load(username)
+        if user_data is None:
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
         # 获取排序数据
         evaluation_results = user_data.get('evaluation_results', {})
 
@@ -1105,7 +1172,8 @@ def get_ranking():
             return jsonify({
                 'status': 'success',
                 'ranking': case_data.get('ranking', []),
-                'tiers': case_data.get('tiers', {})
+                'tiers': case_data.get('tiers', {}),
+                'version': version
             })
         else:
             # 返回所有case的排序数据
@@ -1117,7 +1185,8 @@ def get_ranking():
                 }
             return jsonify({
                 'status': 'success',
-                'rankings': all_rankings
+                'rankings': all_rankings,
+                'version': version
             })
 
     except Exception as e:
@@ -1138,18 +1207,10 @@ def save_case_state():
         if not username or not case_id:
             return jsonify({'error': '缺少用户名或case_id信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        if not evaluator_store.exists(username):
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
-            # 获取当前case的排序数据
+        # 获取当前case的排序数据
         ranking = data.get('ranking', [])
 
         # 获取评估者评分数据（从data中提取所有评估者数据）
@@ -1158,38 +1219,14 @@ def save_case_state():
             if key not in ['username', 'case_id', 'ranking'] and isinstance(value, dict) and 'dimensions' in value:
                 evaluators_data[key] = value
 
-        # 更新或创建case的状态
-        if 'evaluation_results' not in user_data:
-            user_data['evaluation_results'] = {}
-
-        if case_id not in user_data['evaluation_results']:
-            user_data['evaluation_results'][case_id] = {}
-
-        # 添加保存状态和评估者数据
-        user_data['evaluation_results'][case_id].update({
-            'saved': True,
-            'saved_at': datetime.now().isoformat(),
-            'ranking': ranking
-        })
-
-        # 添加每个评估者的数据，合并而不是覆盖
-        for evaluator_id, evaluator_data in evaluators_data.items():
-            if evaluator_id not in user_data['evaluation_results'][case_id]:
-                user_data['evaluation_results'][case_id][evaluator_id] = evaluator_data
-            else:
-                # 如果评估者已存在，合并dimensions数据
-                existing_data = user_data['evaluation_results'][case_id][evaluator_id]
-                if 'dimensions' in evaluator_data and 'dimensions' in existing_data:
-                    # 合并dimensions，保留已有的评分
-                    existing_data['dimensions'].update(
-                        evaluator_data['dimensions'])
-                else:
-                    # 如果结构不匹配，直接替换
-                    user_data['evaluation_results'][case_id][evaluator_id] = evaluator_data
-
-        # 保存更新后的用户文件
-        with open(user_file, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        # 添加保存状态和评估者数据，评估者的dimensions与已有评分合并而不是覆盖
+        try:
+            evaluator_store.append(username, 'case_state', case_id=case_id,
+                                   ranking=ranking, evaluators=evaluators_data,
+                                   base_version=data.get('base_version'),
+                                   writer=data.get('client_id'))
+        except VersionConflict as e:
+            return version_conflict_response(e)
 
         print(f"用户 {username} 的case {case_id} 完整状态保存成功")
         print(f"包含 {len(evaluators_data)} 个评估者的评分数据")
@@ -1197,7 +1234,8 @@ def save_case_state():
         return jsonify({
             'status': 'success',
             'message': 'case状态保存成功',
-            'evaluators_count': len(evaluators_data)
+            'evaluators_count': len(evaluators_data),
+            'version': evaluator_store.version(username)
         })
 
     except Exception as e:
@@ -1219,15 +1257,14 @@ def check_submission_eligibility():
         user_state = get_user_state(username)
 
         # 检查是否完成了所有案例
-        total_cases = len(case_files)
+        case_snapshot = current_case_snapshot()
+        total_cases = len(case_snapshot)
         completed_cases = 0
-        for case_folder_name in case_files:
-            case_folder_path = os.path.join(cases_dir, case_folder_name)
-            if os.path.exists(case_folder_path):
-                llm_files = [f for f in os.listdir(case_folder_path)
-                             if f.startswith('LLM') and f.endswith('.json')]
-                if llm_files:
-                    completed_cases += 1
+        for case_folder_name in case_snapshot.folders:
+            llm_files = [name for name in case_snapshot.transcripts[case_folder_name]
+                         if name.startswith('LLM')]
+            if llm_files:
+                completed_cases += 1
 
         can_submit = completed_cases >= total_cases
 
@@ -1255,17 +1292,12 @@ def get_case_state():
         if not username or not case_id:
             return jsonify({'error': '缺少用户名或case_id信息'}), 400
 
-        # 确保evaluators目录存在
-        evaluators_dir = config.EVALUATORS_DIR
-        user_file = os.path.join(evaluators_dir, f'{username}.json')
-
-        if not os.path.exists(user_file):
+        # 读取用户文档（先取版本号，读取期间的修改会在下次保存时被检测到）
+        version = evaluator_store.version(username)
+        user_data = evaluator_store.load(username)
+        if user_data is None:
             return jsonify({'error': '用户不存在'}), 404
 
-        # 读取用户文件
-        with open(user_file, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-
         # 获取case状态
         case_state = {
             'saved': False,
@@ -1310,7 +1342,8 @@ def get_case_state():
 
         return jsonify({
             'status': 'success',
-            'case_state': case_state
+            'case_state': case_state,
+            'version': version
         })
 
     except Exception as e:
@@ -1331,36 +1364,32 @@ def get_case_evaluators(case_id):
         print(
             f"[get_case_evaluators] 正在查找评估者文件，Case: {case_id}, 路径: {case_folder_path}")
 
-        if not os.path.exists(case_folder_path):
+        case_snapshot = current_case_snapshot()
+        if case_snapshot.index_of(case_folder_name) is None:
             print(f"[get_case_evaluators] Case文件夹不存在: {case_folder_path}")
             return jsonify({'status': 'error', 'message': f'Case {case_id} 不存在'}), 404
 
-        # 获取所有evaluator JSON文件
+        # 获取所有evaluator（病例数据包中的和之后保存到目录中的）
         evaluators = []
         try:
-            files_in_dir = os.listdir(case_folder_path)
-            print(f"[get_case_evaluators] 目录中的文件: {files_in_dir}")
-
-            for file in files_in_dir:
-                if file.endswith('.json') and file != f'case{case_id}.json':
-                    # 这是一个evaluator文件
-                    file_path = os.path.join(case_folder_path, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            evaluator_data = json.load(f)
-                            evaluator_name = file.replace('.json', '')
-                            evaluators.append({
-                                'id': evaluator_name,
-                                'name': evaluator_name,
-                                'file': file,
-                                'data': evaluator_data
-                            })
-                            print(
-                                f"[get_case_evaluators] 加载评估者: {evaluator_name}")
-                    except Exception as e:
-                        print(
-                            f"[get_case_evaluators] 加载评估者文件失败: {file}, 错误: {e}")
-                        continue
+            evaluator_names = case_snapshot.transcripts[case_folder_name]
+            print(f"[get_case_evaluators] 评估者列表: {evaluator_names}")
+
+            for evaluator_name in evaluator_names:
+                evaluator_data = load_transcript(
+                    cases_dir, case_folder_name, evaluator_name)
+                if evaluator_data is None:
+                    print(
+                        f"[get_case_evaluators] 加载评估者文件失败: {evaluator_name}.json")
+                    continue
+                evaluators.append({
+                    'id': evaluator_name,
+                    'name': evaluator_name,
+                    'file': f'{evaluator_name}.json',
+                    'data': evaluator_data
+                })
+                print(
+                    f"[get_case_evaluators] 加载评估者: {evaluator_name}")
         except Exception as e:
             print(f"[get_case_evaluators] 列举目录失败: {case_folder_path}, 错误: {e}")
 
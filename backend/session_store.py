@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """Bounded in-memory map of per-user session dicts
+
+    Sessions are kept in LRU order. A session is evicted when it has been
+    idle longer than ``idle_ttl`` seconds, or when the store holds more
+    than ``max_entries`` sessions or more than ``max_bytes`` estimated
+    bytes. Sessions used within the last ``min_idle`` seconds are never
+    evicted, so a request still working on its session cannot lose
+    writes; the caps are therefore soft under heavy concurrent use. With
+    an ``idle_ttl`` a background thread also sweeps every
+    ``sweep_interval`` seconds, so idle sessions leave memory without
+    further lookups.
+
+    Evicted sessions are written to ``spill_dir`` through ``dehydrate``
+    (which must return JSON-serialisable data) and restored with
+    ``rehydrate`` the next time the user is looked up. Spill files are
+    written outside the store lock; a user who comes back while their
+    session is being written gets the in-memory session back. A spill
+    file is removed only after it was restored; one that cannot be
+    restored is kept as ``*.failed``. ``sizeof`` returns an estimate of a
+    session's memory; it is re-measured whenever the session is looked up
+    again, i.e. after the previous request's changes.
+    """
+
+    def __init__(self, name, factory, dehydrate, rehydrate, sizeof=None,
+                 max_entries=1000, max_bytes=0, idle_ttl=0, min_idle=120,
+                 spill_dir=None, sweep_interval=60):
+        self.name = name
+        self.factory = factory
+        self.dehydrate = dehydrate
+        self.rehydrate = rehydrate
+        self.sizeof = sizeof or (lambda state: 0)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.min_idle = min_idle
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()
+        # Evicted sessions whose spill file is still being written
+        self._spilling = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.evictions = 0
+        self.spills = 0
+        self.rehydrations = 0
+        self.failed_rehydrations = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._stop = threading.Event()
+        self._sweeper = None
+        if idle_ttl and sweep_interval:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval,), daemon=True,
+                name=f'{name}-session-sweeper')
+            self._sweeper.start()
+
+    def _spill_path(self, username):
+        digest = hashlib.sha1(username.encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{self.name}-{digest}.json.gz")
+
+    def get_or_create(self, username):
+        """Return the live session of ``username``, rehydrating or creating it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                size = self.sizeof(entry['state'])
+                self._bytes += size - entry['size']
+                entry['size'] = size
+                entry['used_at'] = now
+                self._entries.move_to_end(username)
+            else:
+                state = self._spilling.pop(username, None)
+                if state is None:
+                    state = self._load_spilled(username)
+                if state is None:
+                    state = self.factory()
+                entry = {'state': state, 'used_at': now,
+                         'size': self.sizeof(state)}
+                self._entries[username] = entry
+                self._bytes += entry['size']
+            evicted = self._enforce(now)
+        self._spill(evicted)
+        return entry['state']
+
+    def _load_spilled(self, username):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(username)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                record = json.load(f)
+            if record.get('username') != username:
+                raise ValueError(f"快照属于其他用户: {record.get('username')}")
+            state = self.rehydrate(username, record['state'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 保留无法恢复的快照，避免会话被永久删除
+            print(f"[Sessions] 恢复会话快照失败: {path}, 错误: {str(e)}")
+            self.failed_rehydrations += 1
+            try:
+                os.replace(path, path + '.failed')
+            except OSError:
+                pass
+            return None
+        os.remove(path)
+        self.rehydrations += 1
+        return state
+
+    def _enforce(self, now):
+        """Remove sessions due for eviction; returns them for ``_spill``"""
+        evicted = []
+        while self._entries:
+            username, entry = next(iter(self._entries.items()))
+            idle = now - entry['used_at']
+            if idle < self.min_idle:
+                break
+            over_capacity = (len(self._entries) > self.max_entries
+                             or (self.max_bytes and self._bytes > self.max_bytes))
+            expired = self.idle_ttl and idle > self.idle_ttl
+            if not (over_capacity or expired):
+                break
+            self._entries.pop(username)
+            self._bytes -= entry['size']
+            self.evictions += 1
+            if self.spill_dir:
+                self._spilling[username] = entry['state']
+                evicted.append((username, entry['state']))
+        return evicted
+
+    def _spill(self, evicted):
+        """Write evicted sessions to disk; called without holding the lock"""
+        for username, state in evicted:
+            path = self._spill_path(username)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                record = {'username': username, 'state': self.dehydrate(state)}
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+            except (OSError, TypeError, ValueError, RuntimeError) as e:
+                with self._lock:
+                    if self._spilling.get(username) is state:
+                        # 写入失败时保留在内存中，不丢失会话
+                        del self._spilling[username]
+                        self._restore(username, state)
+                print(f"[Sessions] 保存会话快照失败: {username}, 错误: {str(e)}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            with self._lock:
+                if self._spilling.get(username) is state:
+                    del self._spilling[username]
+                    os.replace(tmp_path, path)
+                    self.spills += 1
+                    continue
+            # The user came back while the file was written
+            os.remove(tmp_path)
+
+    def _restore(self, username, state):
+        if username in self._entries:
+            return
+        entry = {'state': state, 'used_at': time.monotonic(),
+                 'size': self.sizeof(state)}
+        self._entries[username] = entry
+        self._entries.move_to_end(username, last=False)
+        self._bytes += entry['size']
+
+    def sweep(self):
+        """Evict idle sessions now instead of on the next lookup"""
+        with self._lock:
+            evicted = self._enforce(time.monotonic())
+        self._spill(evicted)
+
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[Sessions] 清理空闲会话失败: {str(e)}")
+
+    def close(self):
+        """Stop the background sweeper"""
+        self._stop.set()
+
+    def __contains__(self, username):
+        with self._lock:
+            return username in self._entries or username in self._spilling
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def items(self):
+        """Snapshot of the sessions currently in memory"""
+        with self._lock:
+            return ([(username, entry['state'])
+                     for username, entry in self._entries.items()]
+                    + list(self._spilling.items()))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'estimated_bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'idle_ttl': self.idle_ttl,
+                'evictions': self.evictions,
+                'spilled': self.spills,
+                'rehydrated': self.rehydrations,
+                'failed_rehydrations': self.failed_rehydrations,
+                'spilling': len(self._spilling)
+            }
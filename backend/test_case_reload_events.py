@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+病例列表热更新后，正在作答的用户收到 case 推送并按新索引保存对话
+"""
+
+import importlib
+import json
+import os
+import shutil
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope='module')
+def analysis(tmp_path_factory):
+    """使用临时conversations目录启动分析服务（不启动目录监听）"""
+    root = tmp_path_factory.mktemp('analysis')
+    conversations_dir = root / 'conversations'
+    shutil.copytree(os.path.join(BACKEND_DIR, 'conversations'), conversations_dir)
+    env = {
+        'CONVERSATIONS_DIR': str(conversations_dir),
+        'CASE_BUNDLE_PATH': str(root / 'missing.bundle'),
+        'CASE_WATCH_ENABLED': 'false',
+        'SESSION_SPILL_DIR': str(root / 'session_spill'),
+        'CLASSIFIER_LABELS_FILE': str(root / 'classifier_labels.jsonl')
+    }
+    saved_env = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        run = importlib.import_module('run')
+        if run.config.CONVERSATIONS_DIR != str(conversations_dir):
+            pytest.skip("run 模块已使用其他配置导入")
+        yield run, conversations_dir
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def test_inserted_case_folder_moves_user_and_notifies(analysis):
+    run, conversations_dir = analysis
+    client = run.app.test_client()
+    username = 'reload_user'
+
+    assert client.post('/api/init-user', json={'username': username}).status_code == 200
+    user_state = run.get_user_state(username)
+    case_folder = user_state['case_key'].split('/')[0]
+    old_index = user_state['current_case_index']
+    old_version = user_state['state_version']
+    assert case_folder == 'case8' and old_index == 0
+
+    subscriber = run.user_events.subscribe(username)
+    try:
+        # 在现有病例之前插入一个新病例
+        new_folder = conversations_dir / 'case1'
+        new_folder.mkdir()
+        shutil.copy(conversations_dir / 'case8' / 'case8.json', new_folder / 'case1.json')
+        run.case_registry.refresh()
+
+        _, event, data = subscriber.get(timeout=5)
+    finally:
+        run.user_events.unsubscribe(username, subscriber)
+
+    new_index = run.case_registry.snapshot.index_of(case_folder)
+    assert new_index == old_index + 1
+    assert event == 'case'
+    assert data['case_index'] == new_index
+    assert user_state['current_case_index'] == new_index
+    assert user_state['state_version'] > old_version
+
+    # 前端收到事件后使用新的索引保存
+    response = client.post('/api/save-conversation', json={
+        'username': username,
+        'case_index': data['case_index'],
+        'conversation': [{'role': 'user', 'content': 'Where does it hurt?'}],
+        'Diagnosis': 'Acute pancreatitis',
+        'Treatment': ''
+    })
+    assert response.status_code == 200
+    saved_path = conversations_dir / case_folder / f'{username}.json'
+    assert saved_path.exists()
+    assert not (conversations_dir / 'case1' / f'{username}.json').exists()
+    with open(saved_path, encoding='utf-8') as f:
+        assert json.load(f)
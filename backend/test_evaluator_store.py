@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评估者数据存储（evaluator_store）的测试：日志回放、SQLite映射、版本冲突和批量提交
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+import evaluator_store
+from evaluator_store import (EvaluatorJournal, ScoreCommitter, SQLiteEvaluatorStore,
+                             VersionConflict, VersionedEvaluatorStore, import_json)
+
+
+def new_document(username):
+    """与 /api/evaluation/create-user 创建的文档结构一致"""
+    return {
+        'username': username,
+        'created_at': '2026-01-27T16:34:10.053942',
+        'evaluations': [],
+        'current_case_index': 0,
+        'total_cases_completed': 0
+    }
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 1, 27, 16, 45, 0)
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    """两种存储各自生成事件时间，比较前固定时钟"""
+    monkeypatch.setattr(evaluator_store, 'datetime', FrozenDatetime)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return EvaluatorJournal(str(tmp_path), compact_bytes=1 << 30, fsync=False)
+
+
+def test_journal_replays_events_over_base_file(journal):
+    journal.create('alice', new_document('alice'))
+    journal.append('alice', 'initialize_case', case_id='8')
+    journal.append('alice', 'dimension_score', case_id='8', evaluator_id='Expert',
+                   dimension_key='accuracy', score=4)
+    journal.append('alice', 'feedback', case_id='8', evaluator_id='Expert',
+                   feedback='clear reasoning')
+
+    # 基础文件保持不变，变化只写入日志
+    with open(journal.document_path('alice'), encoding='utf-8') as f:
+        assert json.load(f) == new_document('alice')
+
+    document = journal.load('alice')
+    assert document['evaluation_results']['8']['Expert']['dimensions'] == {'accuracy': 4}
+    assert document['feedback']['8'] == {'Expert': 'clear reasoning'}
+
+
+def test_torn_last_journal_line_is_recovered(journal):
+    journal.create('alice', new_document('alice'))
+    journal.append('alice', 'dimension_score', case_id='8', evaluator_id='Expert',
+                   dimension_key='accuracy', score=4)
+    # 模拟追加写入到一半时进程崩溃
+    with open(journal.journal_path('alice'), 'ab') as f:
+        f.write(b'{"op":"dimension_score","case_id":"8","evalua')
+
+    document = journal.load('alice')
+    assert document['evaluation_results']['8']['Expert']['dimensions'] == {'accuracy': 4}
+
+    # 下一次追加不能接在损坏的行后面
+    journal.append('alice', 'dimension_score', case_id='8', evaluator_id='Expert',
+                   dimension_key='safety', score=5)
+    document = journal.load('alice')
+    assert document['evaluation_results']['8']['Expert']['dimensions'] == {
+        'accuracy': 4, 'safety': 5}
+
+
+def test_compaction_folds_journal_into_base_file(journal):
+    journal.create('alice', new_document('alice'))
+    for score in range(5):
+        journal.append('alice', 'dimension_score', case_id='8', evaluator_id='Expert',
+                       dimension_key='accuracy', score=score)
+    expected = journal.load('alice')
+
+    assert journal.compact('alice')
+    assert not os.path.exists(journal.journal_path('alice'))
+    with open(journal.document_path('alice'), encoding='utf-8') as f:
+        assert json.load(f) == expected
+    assert journal.load('alice') == expected
+    assert not journal.compact('alice')
+
+
+def apply_session(store, username):
+    """一次完整的评估流程，覆盖所有事件类型"""
+    store.create(username, new_document(username))
+    store.append(username, 'update', fields={'current_case_index': 1,
+                                             'updated_at': '2026-01-27T16:40:00'})
+    store.append(username, 'initialize_case', case_id='8')
+    store.append(username, 'dimension_score', case_id='8', evaluator_id='Expert',
+                 dimension_key='accuracy', score=4)
+    store.append(username, 'dimension_scores', scores=[
+        {'case_id': '8', 'evaluator_id': 'Model', 'dimension_key': 'accuracy', 'score': 3},
+        {'case_id': '8', 'evaluator_id': 'Model', 'dimension_key': 'safety', 'score': 5}])
+    store.append(username, 'feedback', case_id='8', evaluator_id='Expert',
+                 feedback='clear reasoning')
+    store.append(username, 'ranking', case_id='8', ranking=['Expert', 'Model'],
+                 tiers=[['Expert'], ['Model']])
+    store.append(username, 'case_state', case_id='9', ranking=['Model', 'Expert'],
+                 evaluators={'Expert': {'dimensions': {'accuracy': 2}},
+                             'Model': {'dimensions': {'accuracy': 5}}})
+
+
+@pytest.mark.parametrize('submit', [False, True])
+def test_json_and_sqlite_load_identical_documents(tmp_path, frozen_clock, submit):
+    (tmp_path / 'evaluators').mkdir()
+    json_store = EvaluatorJournal(str(tmp_path / 'evaluators'), fsync=False)
+    sqlite_store = SQLiteEvaluatorStore(str(tmp_path / 'evaluations.db'), fsync=False)
+    for store in (json_store, sqlite_store):
+        apply_session(store, 'alice')
+        if submit:
+            store.append('alice', 'submit', evaluation_results={})
+        store.create('bob', new_document('bob'))
+
+    for username in ('alice', 'bob'):
+        assert sqlite_store.load(username) == json_store.load(username)
+    for case_id in ('8', '9', '10'):
+        assert sqlite_store.case_results(case_id) == json_store.case_results(case_id)
+
+
+def test_import_json_copies_documents_with_pending_journal(tmp_path, frozen_clock):
+    (tmp_path / 'evaluators').mkdir()
+    evaluators_dir = str(tmp_path / 'evaluators')
+    db_path = str(tmp_path / 'evaluations.db')
+    json_store = EvaluatorJournal(evaluators_dir, fsync=False)
+    apply_session(json_store, 'alice')
+    json_store.create('bob', new_document('bob'))
+
+    assert import_json(evaluators_dir, db_path) == 2
+    # 重复导入会替换已有用户
+    assert import_json(evaluators_dir, db_path) == 2
+    sqlite_store = SQLiteEvaluatorStore(db_path, fsync=False)
+    assert sorted(sqlite_store.usernames()) == ['alice', 'bob']
+    assert sqlite_store.load('alice') == json_store.load('alice')
+    assert sqlite_store.case_results('8') == json_store.case_results('8')
+
+
+@pytest.fixture
+def versioned(journal):
+    store = VersionedEvaluatorStore(journal)
+    store.create('alice', new_document('alice'))
+    return store
+
+
+def score(versioned, dimension_key, value, base_version, writer):
+    return versioned.append('alice', 'dimension_score', base_version=base_version,
+                            writer=writer, case_id='8', evaluator_id='Expert',
+                            dimension_key=dimension_key, score=value)
+
+
+def dimensions(versioned):
+    return versioned.load('alice')['evaluation_results']['8']['Expert']['dimensions']
+
+
+def test_stale_write_to_other_field_is_merged(versioned):
+    base = versioned.version('alice')
+    score(versioned, 'accuracy', 4, base, 'tab-1')
+    # 另一个标签页基于旧版本修改了不同的维度
+    score(versioned, 'safety', 5, base, 'tab-2')
+    assert dimensions(versioned) == {'accuracy': 4, 'safety': 5}
+    assert versioned.merged == 1
+    assert versioned.conflicts == 0
+
+
+def test_stale_write_to_same_field_conflicts(versioned):
+    base = versioned.version('alice')
+    score(versioned, 'accuracy', 4, base, 'tab-1')
+    with pytest.raises(VersionConflict) as excinfo:
+        score(versioned, 'accuracy', 1, base, 'tab-2')
+    assert excinfo.value.fields == ['dimension/8/Expert/accuracy']
+    assert excinfo.value.version == versioned.version('alice')
+    assert dimensions(versioned) == {'accuracy': 4}
+
+    # 同一写入者覆盖自己的修改不算冲突；新版本也可以写入
+    score(versioned, 'accuracy', 3, base, 'tab-1')
+    score(versioned, 'accuracy', 2, versioned.version('alice'), 'tab-2')
+    assert dimensions(versioned) == {'accuracy': 2}
+
+
+def test_base_version_from_previous_process_is_not_checked(versioned):
+    score(versioned, 'accuracy', 4, versioned.version('alice'), 'tab-1')
+    score(versioned, 'accuracy', 1, 'oldepoch.1', 'tab-2')
+    assert dimensions(versioned) == {'accuracy': 1}
+
+
+@pytest.mark.parametrize('atomic', [False, True])
+def test_append_scores_rejects_conflicting_items(versioned, atomic):
+    base = versioned.version('alice')
+    score(versioned, 'accuracy', 4, base, 'tab-1')
+    items = [
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'accuracy',
+         'score': 1, 'base_version': base, 'writer': 'tab-2'},
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'safety',
+         'score': 5, 'base_version': base, 'writer': 'tab-2'}
+    ]
+    version = versioned.version('alice')
+    results = versioned.append_scores('alice', items, atomic=atomic)
+
+    assert isinstance(results[0], VersionConflict)
+    if atomic:
+        assert results[1] is results[0]
+        assert dimensions(versioned) == {'accuracy': 4}
+        assert versioned.version('alice') == version
+    else:
+        assert results[1] is None
+        assert dimensions(versioned) == {'accuracy': 4, 'safety': 5}
+        assert versioned.version('alice') != version
+
+
+def submit_concurrently(committer, calls):
+    """同时发起多个保存请求，返回每个请求抛出的异常（成功为None）"""
+    barrier = threading.Barrier(len(calls))
+    errors = [None] * len(calls)
+
+    def run(index, kwargs):
+        barrier.wait()
+        try:
+            committer.submit('alice', **kwargs)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index, kwargs))
+               for index, kwargs in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return errors
+
+
+def test_concurrent_score_saves_are_group_committed(journal, versioned):
+    committer = ScoreCommitter(versioned, window=0.2)
+    calls = [{'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': f'd{index}',
+              'score': index} for index in range(8)]
+
+    assert submit_concurrently(committer, calls) == [None] * len(calls)
+    snapshot = committer.snapshot()
+    assert snapshot['requests'] == 8
+    assert snapshot['commits'] < 8
+    # submit返回时分数已经写入日志，每次提交只追加一行
+    assert dimensions(versioned) == {f'd{index}': index for index in range(8)}
+    with open(journal.journal_path('alice'), encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == snapshot['commits']
+
+
+def test_group_commit_reports_errors_to_their_own_request(versioned):
+    committer = ScoreCommitter(versioned, window=0.2)
+    base = versioned.version('alice')
+    committer.submit('alice', '8', 'Expert', 'accuracy', 4, base, 'tab-1')
+    calls = [
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'accuracy',
+         'score': 1, 'base_version': base, 'writer': 'tab-2'},
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'safety',
+         'score': 5, 'base_version': base, 'writer': 'tab-2'}
+    ]
+
+    errors = submit_concurrently(committer, calls)
+    assert isinstance(errors[0], VersionConflict)
+    assert errors[1] is None
+    assert dimensions(versioned) == {'accuracy': 4, 'safety': 5}
+
+
+def test_group_commit_propagates_storage_failures():
+    class BrokenStore:
+        def append_scores(self, username, scores, atomic=False):
+            raise OSError('disk full')
+
+    committer = ScoreCommitter(BrokenStore(), window=0.05)
+    errors = submit_concurrently(committer, [
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'accuracy', 'score': 4},
+        {'case_id': '8', 'evaluator_id': 'Expert', 'dimension_key': 'safety', 'score': 5}])
+    assert all(isinstance(error, OSError) for error in errors)
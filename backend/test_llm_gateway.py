@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLMGateway 的排队、超时和容量回收测试
+"""
+
+import threading
+
+import pytest
+
+from llm_gateway import LLMGateway, GatewayBusyError, GatewayTimeoutError
+
+
+def test_queued_timeouts_release_capacity():
+    """排队中超时被取消的调用必须归还准入名额"""
+    gateway = LLMGateway(max_in_flight=1, max_queue=2, timeout=0.2)
+    release = threading.Event()
+    blocker = gateway.submit(release.wait, 5)
+
+    # 两个排队的调用都超时并被取消
+    for _ in range(2):
+        with pytest.raises(GatewayTimeoutError):
+            gateway.call(lambda: 'never')
+
+    metrics = gateway.metrics()
+    assert metrics['queue_depth'] == 0
+    assert metrics['in_flight'] == 1
+    assert metrics['timed_out'] == 2
+
+    release.set()
+    blocker.result(timeout=5)
+
+    # 名额全部归还：一个执行中加两个排队的调用都能被接受
+    release.clear()
+    futures = [gateway.submit(release.wait, 5) for _ in range(3)]
+    with pytest.raises(GatewayBusyError):
+        gateway.submit(lambda: None)
+    release.set()
+    for future in futures:
+        assert future.result(timeout=5) is True
+
+    metrics = gateway.metrics()
+    assert metrics['queue_depth'] == 0
+    assert metrics['in_flight'] == 0
+    assert gateway.call(lambda: 'ok') == 'ok'
+
+
+def test_stalled_queued_stream_releases_capacity():
+    """排队中等待超时的流式调用同样归还名额"""
+    gateway = LLMGateway(max_in_flight=1, max_queue=1, timeout=0.2)
+    release = threading.Event()
+    blocker = gateway.submit(release.wait, 5)
+
+    with pytest.raises(GatewayTimeoutError):
+        list(gateway.stream(lambda: iter(['never'])))
+
+    release.set()
+    blocker.result(timeout=5)
+    assert gateway.metrics()['queue_depth'] == 0
+    assert list(gateway.stream(lambda: iter(['a', 'b']))) == ['a', 'b']
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SessionStore 的会话换出、恢复和空闲清理测试
+"""
+
+import gzip
+import os
+import threading
+import time
+
+from session_store import SessionStore
+
+
+def make_store(tmp_path, **kwargs):
+    options = dict(max_entries=1, min_idle=0, spill_dir=str(tmp_path),
+                   sweep_interval=0)
+    options.update(kwargs)
+    return SessionStore(
+        'test', factory=lambda: {'messages': []},
+        dehydrate=lambda state: state,
+        rehydrate=lambda username, data: data,
+        **options)
+
+
+def test_spill_and_rehydrate(tmp_path):
+    store = make_store(tmp_path)
+    store.get_or_create('a')['messages'].append('hello')
+    store.get_or_create('b')  # a 被换出到磁盘
+    assert 'a' not in store
+    assert store.get_or_create('a') == {'messages': ['hello']}
+    assert store.snapshot()['rehydrated'] == 1
+
+
+def test_failed_rehydrate_keeps_spill_file(tmp_path):
+    """恢复失败时不能删除快照文件"""
+    store = make_store(tmp_path)
+    store.get_or_create('a')['messages'].append('keep me')
+    store.get_or_create('b')
+    path = store._spill_path('a')
+    assert os.path.exists(path)
+
+    def broken(username, data):
+        raise KeyError('case_key')
+
+    store.rehydrate = broken
+    assert store.get_or_create('a') == {'messages': []}
+    assert not os.path.exists(path)
+    with gzip.open(path + '.failed', 'rt', encoding='utf-8') as f:
+        assert 'keep me' in f.read()
+    assert store.snapshot()['failed_rehydrations'] == 1
+
+
+def test_user_returning_during_spill_keeps_session(tmp_path):
+    """换出写盘期间用户再次访问，拿回内存中的同一个会话"""
+    writing = threading.Event()
+    finish = threading.Event()
+
+    def slow_dehydrate(state):
+        writing.set()
+        finish.wait(5)
+        return state
+
+    store = make_store(tmp_path, max_entries=10, idle_ttl=0.01)
+    store.dehydrate = slow_dehydrate
+    session = store.get_or_create('a')
+    session['messages'].append('live')
+    time.sleep(0.05)
+
+    sweeper = threading.Thread(target=store.sweep)
+    sweeper.start()
+    assert writing.wait(5)
+    # 写盘不持有存储锁，其他用户的请求不被阻塞
+    store.idle_ttl = 0
+    assert store.get_or_create('a') is session
+    finish.set()
+    sweeper.join(5)
+
+    assert not os.path.exists(store._spill_path('a'))
+    assert store.get_or_create('a') is session
+
+
+def test_background_sweep_evicts_idle_sessions(tmp_path):
+    store = make_store(tmp_path, max_entries=10, idle_ttl=0.05,
+                       sweep_interval=0.02)
+    try:
+        store.get_or_create('a')
+        deadline = time.monotonic() + 5
+        while 'a' in store and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert 'a' not in store
+        assert os.path.exists(store._spill_path('a'))
+    finally:
+        store.close()
@@ -0,0 +1,80 @@
+import queue
+import threading
+
+
+class UserEventHub:
+    """Per-user fan-out of change notifications
+
+    Every ``publish`` bumps the user's event version and hands
+    ``(version, event, data)`` to each subscriber queue of that user
+    (one per open push connection). Slow subscribers whose queue is full
+    miss events rather than blocking the publisher; they resynchronise
+    from the ``hello`` event sent when they reconnect. Long-poll requests
+    block in ``wait_for`` and are woken by every publish.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self.waiting = 0
+        self._versions = {}
+        self._subscribers = {}
+        self.published = 0
+        self.dropped = 0
+
+    def version(self, username):
+        with self._lock:
+            return self._versions.get(username, 0)
+
+    def publish(self, username, event, data=None):
+        """Notify every subscriber of ``username``, return the new version"""
+        with self._lock:
+            version = self._versions.get(username, 0) + 1
+            self._versions[username] = version
+            self.published += 1
+            for subscriber in self._subscribers.get(username, ()):
+                try:
+                    subscriber.put_nowait((version, event, data or {}))
+                except queue.Full:
+                    self.dropped += 1
+            self._published.notify_all()
+        return version
+
+    def wait_for(self, predicate, timeout):
+        """Block until ``predicate()`` is true or ``timeout`` seconds pass
+
+        The predicate is re-checked after every publish (for any user) and
+        must be cheap. Returns its last value.
+        """
+        with self._published:
+            self.waiting += 1
+            try:
+                return self._published.wait_for(predicate, timeout)
+            finally:
+                self.waiting -= 1
+
+    def subscribe(self, username):
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(username, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, username, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(username)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[username]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'users': len(self._versions),
+                'connections': sum(len(s) for s in self._subscribers.values()),
+                'long_polls': self.waiting,
+                'published': self.published,
+                'dropped': self.dropped
+            }
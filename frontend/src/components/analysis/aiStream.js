@@ -0,0 +1,72 @@
+// 通过 /get-ai-response-stream 获取AI回复（SSE，POST请求，因此用fetch读取响应流）
+// 每收到一段回复调用一次onDelta(已收到的完整文本)，结束时返回done事件的数据。
+// 浏览器不支持读取响应流或后端没有流式接口时抛出StreamUnavailableError，
+// 调用方应改用阻塞的 /get-ai-response。
+
+export class StreamUnavailableError extends Error {}
+
+// 解析一个SSE事件块（"event: ...\ndata: ..."）
+const parseEvent = (block) => {
+  let name = 'message';
+  const dataLines = [];
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      name = line.slice('event:'.length).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice('data:'.length).trim());
+    }
+  });
+  if (!dataLines.length) {
+    return null;
+  }
+  return { name, data: JSON.parse(dataLines.join('\n')) };
+};
+
+export const streamAIResponse = async (baseURL, body, onDelta) => {
+  if (typeof window === 'undefined' || !window.fetch || !window.TextDecoder) {
+    throw new StreamUnavailableError("浏览器不支持流式读取");
+  }
+
+  const response = await fetch(`${baseURL}/get-ai-response-stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  if (response.status === 404 || response.status === 405 || !response.body) {
+    throw new StreamUnavailableError(`流式接口不可用: HTTP ${response.status}`);
+  }
+  if (!response.ok) {
+    throw new Error(`HTTP ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let reply = '';
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const event = parseEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+      if (!event) {
+        continue;
+      }
+      if (event.name === 'done') {
+        return event.data;
+      }
+      if (event.name === 'error') {
+        throw new Error(event.data.message || "流式回复失败");
+      }
+      reply += event.data.delta || '';
+      onDelta(reply);
+    }
+  }
+  throw new Error("流式回复意外结束");
+};
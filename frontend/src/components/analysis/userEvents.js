@@ -0,0 +1,149 @@
+// 订阅后端按用户推送的状态变化
+// 同一页面中的多个组件共享一个连接，优先使用SSE（/api/events）；
+// SSE被关闭或代理缓冲导致收不到hello事件时，改用 /current-case 的长轮询
+// （since_version），只能收到 case 事件；长轮询也失败时调用onUnavailable，
+// 组件应恢复为定时轮询。
+
+const EVENT_NAMES = ['hello', 'case', 'saved', 'reply'];
+const HELLO_TIMEOUT_MS = 5000;
+const LONG_POLL_TIMEOUT_S = 25;
+const LONG_POLL_MAX_FAILURES = 3;
+
+const connections = {};
+
+const emit = (connection, name, data) => {
+  connection.listeners.forEach((listener) => listener.onEvent(name, data));
+};
+
+// 推送彻底不可用：通知所有订阅者恢复轮询
+const giveUp = (key) => {
+  const connection = connections[key];
+  if (!connection) {
+    return;
+  }
+  delete connections[key];
+  connection.listeners.forEach((listener) => listener.onUnavailable && listener.onUnavailable());
+  connection.listeners.clear();
+};
+
+const startLongPoll = async (key, baseURL, username) => {
+  const connection = connections[key];
+  if (!connection) {
+    return;
+  }
+  console.log("SSE不可用，改用长轮询获取案例变化");
+  connection.mode = 'long-poll';
+
+  let sinceVersion = null;
+  let failures = 0;
+  while (connections[key] === connection) {
+    try {
+      const params = new URLSearchParams({ username, timeout: LONG_POLL_TIMEOUT_S });
+      if (sinceVersion !== null) {
+        params.set('since_version', sinceVersion);
+      }
+      const response = await fetch(`${baseURL}/current-case?${params}`, { cache: 'no-store' });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const data = await response.json();
+      if (data.state_version === undefined) {
+        throw new Error("后端不支持长轮询");
+      }
+      failures = 0;
+      if (connections[key] !== connection) {
+        break;
+      }
+      if (sinceVersion === null) {
+        emit(connection, 'hello', data);
+      } else if (data.state_version !== sinceVersion) {
+        emit(connection, 'case', data);
+      }
+      sinceVersion = data.state_version;
+    } catch (error) {
+      failures += 1;
+      console.error("长轮询失败:", error);
+      if (failures >= LONG_POLL_MAX_FAILURES) {
+        giveUp(key);
+        return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  }
+};
+
+// SSE不可用时关闭EventSource并切换到长轮询
+const fallBackFromSSE = (key, baseURL, username) => {
+  const connection = connections[key];
+  if (!connection || connection.mode !== 'sse') {
+    return;
+  }
+  clearTimeout(connection.helloTimer);
+  connection.source.close();
+  startLongPoll(key, baseURL, username);
+};
+
+const openConnection = (baseURL, username, key) => {
+  const connection = { mode: 'sse', source: null, listeners: new Set(), helloTimer: null };
+  connections[key] = connection;
+
+  if (!window.EventSource) {
+    connection.mode = 'long-poll';
+    startLongPoll(key, baseURL, username);
+    return connection;
+  }
+
+  const source = new EventSource(`${baseURL}/api/events?username=${encodeURIComponent(username)}`);
+  connection.source = source;
+
+  // 代理缓冲SSE时事件永远到不了，超时后视为不可用
+  connection.helloTimer = setTimeout(() => fallBackFromSSE(key, baseURL, username), HELLO_TIMEOUT_MS);
+
+  EVENT_NAMES.forEach((name) => {
+    source.addEventListener(name, (event) => {
+      if (name === 'hello') {
+        clearTimeout(connection.helloTimer);
+      }
+      let data = {};
+      try {
+        data = JSON.parse(event.data);
+      } catch (error) {
+        console.error("解析推送事件失败:", error);
+      }
+      emit(connection, name, data);
+    });
+  });
+
+  // 网络中断时EventSource会自动重连（重连后会再次收到hello），只有彻底关闭时才回退
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) {
+      fallBackFromSSE(key, baseURL, username);
+    }
+  };
+
+  return connection;
+};
+
+// 返回取消订阅的函数；无法订阅时返回null
+export const subscribeUserEvents = (baseURL, username, onEvent, onUnavailable) => {
+  if (typeof window === 'undefined' || !window.fetch || !username) {
+    return null;
+  }
+
+  const key = `${baseURL}|${username}`;
+  const connection = connections[key] || openConnection(baseURL, username, key);
+  const listener = { onEvent, onUnavailable };
+  connection.listeners.add(listener);
+
+  return () => {
+    connection.listeners.delete(listener);
+    if (connection.listeners.size === 0 && connections[key] === connection) {
+      clearTimeout(connection.helloTimer);
+      if (connection.source) {
+        connection.source.close();
+      }
+      // 删除后长轮询循环会在当前请求返回后退出
+      delete connections[key];
+    }
+  };
+};